@@ -0,0 +1,97 @@
+"""
+冷启动导入耗时测量。
+
+在全新的子进程中导入指定模块，多次运行取最小值，并用 -X importtime 列出
+累计耗时最多的依赖包，用于发现被提前加载的重量级依赖。
+
+用法：
+    python benchmarks/import_time.py --repeat 5 --max-ms 50
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 测量的导入语句 -> 说明
+STATEMENTS = {
+    "import src": "包本身（公开名称延迟加载）",
+    "import src.core.builder": "DataBuilder 及其直接依赖",
+    "from src.models import create_model": "模型注册表（不导入具体实现）",
+    "from src.runtimes import create_runtime": "运行时注册表（不导入具体实现）",
+}
+
+
+def run_python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def measure_import(statement: str, repeat: int) -> float:
+    """返回导入语句的最小耗时（毫秒），不含解释器自身的启动时间"""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    timings = [float(run_python(code).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    return min(timings) * 1000
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """解析 -X importtime 的输出：顶层包名 -> 累计耗时（毫秒）"""
+    cumulative: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, total, name = line.split("|")
+        try:
+            total_ms = int(total) / 1000
+        except ValueError:
+            continue
+        package = name.strip().split(".")[0]
+        cumulative[package] = max(cumulative.get(package, 0.0), total_ms)
+    return cumulative
+
+
+def slowest_packages(statement: str, top: int) -> List[Tuple[str, float]]:
+    """找出导入语句额外加载的、累计耗时最多的包（不含解释器启动时已加载的包）"""
+    startup = parse_importtime(run_python("pass", "-X", "importtime").stderr)
+    loaded = parse_importtime(run_python(statement, "-X", "importtime").stderr)
+    extra = {name: ms for name, ms in loaded.items() if name not in startup and name != "src"}
+    return sorted(extra.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量冷启动导入耗时")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="import src 超过该耗时（毫秒）时返回非零退出码")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    baseline = measure_import("pass", args.repeat)
+    results = {}
+    for statement, description in STATEMENTS.items():
+        results[statement] = measure_import(statement, args.repeat) - baseline
+        print(f"{statement:<45} {results[statement]:8.1f} ms  {description}")
+        for name, ms in slowest_packages(statement, args.top):
+            print(f"    {name:<41} {ms:8.1f} ms")
+    print(f"\n共耗时 {time.perf_counter() - start:.1f} 秒")
+
+    if args.max_ms is not None and results["import src"] > args.max_ms:
+        print(f"import src 耗时 {results['import src']:.1f} ms，超过上限 {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+本地模拟的 OpenAI 兼容服务，用于压测，不产生真实 API 费用。
+
+支持 POST /v1/chat/completions（含 stream=True 的 SSE 流式输出），可配置：
+1. 延迟分布：对数正态分布的首 token 延迟 + 按输出 token 速率计算的生成时间
+2. 错误率：按比例返回 500 错误和带 Retry-After 的 429 限流错误
+3. 响应内容：分类标签（支持 [序号] 多行合并格式）或按字段定义生成的 JSON 数组
+
+用法：
+    python benchmarks/mock_server.py --port 8000 --latency-ms 200 --rate-limit-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+
+@dataclass
+class MockServerConfig:
+    host: str = "127.0.0.1"
+    port: int = 0
+    # 首 token 延迟的中位数（毫秒）和对数正态分布的 sigma
+    latency_ms: float = 100.0
+    latency_sigma: float = 0.5
+    # 输出 token 速率（token/秒），0 表示不模拟生成时间
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    # 分类响应：输出前缀和候选标签
+    output_prefix: str = "情感分类: "
+    labels: List[str] = field(default_factory=lambda: ["正面", "负面", "中性"])
+    # 生成响应：字段名 -> 可选值（为空时生成随机文本）
+    json_fields: Dict[str, List[str]] = field(
+        default_factory=lambda: {"text": [], "label": ["正面", "负面", "中性"]}
+    )
+    default_samples: int = 10
+    seed: Optional[int] = None
+
+
+_PACKED_INPUT_PATTERN = re.compile(r'^\[(\d+)\]', re.MULTILINE)
+_SAMPLE_COUNT_PATTERN = re.compile(r'生成(\d+)条')
+
+
+class MockOpenAIServer:
+    def __init__(self, config: Optional[MockServerConfig] = None):
+        self.config = config or MockServerConfig()
+        self.random = random.Random(self.config.seed)
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "completion_tokens": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self) -> str:
+        """启动服务，返回 base_url"""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.config.host, self.config.port
+        )
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> 'MockOpenAIServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个 keep-alive 连接上的所有请求"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method == 'POST' and path.rstrip('/').endswith('/chat/completions'):
+                    await self._handle_chat(json.loads(body or b'{}'), writer)
+                else:
+                    self._write_json(writer, 404, {"error": {"message": "not found"}})
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 服务关闭时仍保持着的空闲连接
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_chat(self, request: Dict[str, Any], writer: asyncio.StreamWriter):
+        config = self.config
+        self.stats["requests"] += 1
+        await asyncio.sleep(self._sample_latency())
+
+        roll = self.random.random()
+        if roll < config.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            self._write_json(writer, 429, {
+                "error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}
+            }, extra_headers={"retry-after": str(config.retry_after_seconds)})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            self.stats["errors"] += 1
+            self._write_json(writer, 500, {
+                "error": {"message": "Internal server error", "type": "server_error"}
+            })
+            return
+
+        messages = request.get("messages", [])
+        content = self._build_content(messages)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 2 + 1
+        completion_tokens = max(len(content) // 2, 1)
+        self.stats["completion_tokens"] += completion_tokens
+        if config.tokens_per_second > 0:
+            generation_time = completion_tokens / config.tokens_per_second
+        else:
+            generation_time = 0.0
+
+        response_id = f"chatcmpl-mock-{self.stats['requests']}"
+        model = request.get("model", "mock-model")
+        if request.get("stream"):
+            await self._write_stream(writer, response_id, model, content, generation_time)
+            return
+
+        await asyncio.sleep(generation_time)
+        self._write_json(writer, 200, {
+            "id": response_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    def _sample_latency(self) -> float:
+        config = self.config
+        if config.latency_ms <= 0:
+            return 0.0
+        mu = math.log(config.latency_ms / 1000)
+        return self.random.lognormvariate(mu, config.latency_sigma)
+
+    def _build_content(self, messages: List[Dict[str, Any]]) -> str:
+        """根据请求内容构造分类标签或 JSON 数组响应"""
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+        if "JSON" in system:
+            match = _SAMPLE_COUNT_PATTERN.search(user)
+            count = int(match.group(1)) if match else self.config.default_samples
+            return json.dumps(
+                [self._build_item() for _ in range(count)], ensure_ascii=False
+            )
+
+        indexes = _PACKED_INPUT_PATTERN.findall(user)
+        if indexes:
+            return "\n".join(
+                f"[{i}] {self.config.output_prefix}{self.random.choice(self.config.labels)}"
+                for i in indexes
+            )
+        if not system:
+            # 原始提示词（如提示词优化请求）
+            return "请根据输入文本判断情感，只输出预定义标签之一。"
+        return f"{self.config.output_prefix}{self.random.choice(self.config.labels)}"
+
+    def _build_item(self) -> Dict[str, Any]:
+        item = {}
+        for name, choices in self.config.json_fields.items():
+            if choices:
+                item[name] = self.random.choice(choices)
+            else:
+                item[name] = f"模拟文本{self.random.getrandbits(48):x}"
+        return item
+
+    async def _write_stream(
+        self,
+        writer: asyncio.StreamWriter,
+        response_id: str,
+        model: str,
+        content: str,
+        generation_time: float
+    ):
+        """以 SSE 格式分块输出"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+        delay = generation_time / len(pieces)
+        try:
+            for piece in pieces + [None]:
+                chunk = {
+                    "id": response_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": piece} if piece is not None else {},
+                        "finish_reason": None if piece is not None else "stop"
+                    }]
+                }
+                self._write_chunk(writer, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                await writer.drain()
+                if delay:
+                    await asyncio.sleep(delay)
+            self._write_chunk(writer, "data: [DONE]\n\n")
+            writer.write(b"0\r\n\r\n")
+        except ConnectionError:
+            # 客户端提前关闭了流
+            pass
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, text: str):
+        data = text.encode('utf-8')
+        writer.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+
+    @staticmethod
+    def _write_json(
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Dict[str, Any],
+        extra_headers: Optional[Dict[str, str]] = None
+    ):
+        reasons = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            **(extra_headers or {})
+        }
+        head = f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n" + "".join(
+            f"{key}: {value}\r\n" for key, value in headers.items()
+        ) + "\r\n"
+        writer.write(head.encode('latin-1') + body)
+
+
+async def _serve(config: MockServerConfig):
+    server = MockOpenAIServer(config)
+    base_url = await server.start()
+    print(f"模拟服务已启动: {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockServerConfig(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_seconds=args.retry_after,
+        seed=args.seed
+    )
+    try:
+        asyncio.run(_serve(config))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+端到端吞吐压测。
+
+启动本地模拟服务，依次压测 OpenAIRuntime.run、OpenAIModel.generate、
+DataBuilder.generate_dataset 和 Agent.learn，在多个数据规模下统计：
+吞吐（行/秒）、单次 HTTP 请求延迟的 p50/p95/p99、请求在并发名额、限流和重试上的
+等待时间，以及 Python 内存峰值。
+
+用法：
+    python benchmarks/run_benchmarks.py --sizes 100 1000 --latency-ms 50 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextvars import ContextVar
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from benchmarks.mock_server import MockOpenAIServer, MockServerConfig
+from src.core.runtime import get_transport_registry
+from src.utils.metrics import get_metrics_collector
+from src.utils.tracing import ChromeTraceExporter, enable_tracing, disable_tracing
+
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（线性插值）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# 当前 _request 调用中各次 HTTP 请求的耗时
+_http_spent: ContextVar[Optional[List[float]]] = ContextVar('_http_spent', default=None)
+
+
+def instrument(obj: Any, latencies: Dict[str, List[float]]) -> None:
+    """包装运行时或模型的 _request 和 _create，分别记录 HTTP 耗时和等待时间
+
+    _create 只包含 HTTP 请求（启用对冲时包含对冲请求），计入 latencies["http"]；
+    _request 的总耗时减去其中的 HTTP 耗时即为等待并发名额、限流和重试退避的时间，
+    计入 latencies["wait"]。
+    """
+    request, create = obj._request, obj._create
+
+    async def timed_request(*args, **kwargs):
+        spent: List[float] = []
+        token = _http_spent.set(spent)
+        start = time.perf_counter()
+        try:
+            return await request(*args, **kwargs)
+        finally:
+            latencies["wait"].append(time.perf_counter() - start - sum(spent))
+            _http_spent.reset(token)
+
+    async def timed_create(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await create(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            latencies["http"].append(elapsed)
+            spent = _http_spent.get()
+            if spent is not None:
+                spent.append(elapsed)
+
+    obj._request = timed_request
+    obj._create = timed_create
+
+
+async def measure(
+    name: str,
+    size: int,
+    run: Callable[[Dict[str, List[float]]], Awaitable[int]],
+    trace_memory: bool = True
+) -> Dict[str, Any]:
+    """执行一次压测，run 返回处理的行数
+
+    tracemalloc 会明显拖慢执行，只关心吞吐时可以关闭内存统计。
+    """
+    latencies: Dict[str, List[float]] = {"http": [], "wait": []}
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    rows = await run(latencies)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "entry_point": name,
+        "size": size,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else 0.0,
+        "requests": len(latencies["http"]),
+        "p50_ms": round(percentile(latencies["http"], 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies["http"], 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies["http"], 0.99) * 1000, 1),
+        "wait_p50_ms": round(percentile(latencies["wait"], 0.50) * 1000, 1),
+        "wait_p99_ms": round(percentile(latencies["wait"], 0.99) * 1000, 1),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2)
+    }
+
+
+def make_reviews(size: int) -> pd.DataFrame:
+    labels = ["正面", "负面", "中性"]
+    return pd.DataFrame({
+        "text": [f"第{i}条商品评论" for i in range(size)],
+        "sentiment": [labels[i % 3] for i in range(size)]
+    })
+
+
+def make_skill():
+    from src.skills.classification import ClassificationSkill
+    return ClassificationSkill(
+        name='sentiment',
+        instructions='对商品评论进行情感分类',
+        labels={'sentiment': ["正面", "负面", "中性"]},
+        input_template='评论文本: {text}',
+        output_template='情感分类: {sentiment}'
+    )
+
+
+def make_runtime(base_url: str, args: argparse.Namespace):
+    from src.runtimes.openai import OpenAIRuntime
+    from src.core.config import AdaptiveConcurrencyConfig, HedgingConfig
+    adaptive = AdaptiveConcurrencyConfig(
+        initial_limit=min(8, args.concurrency), max_limit=args.concurrency
+    ) if getattr(args, 'adaptive_concurrency', False) else None
+    hedge_percentile = getattr(args, 'hedge_percentile', None)
+    hedging = HedgingConfig(percentile=hedge_percentile) if hedge_percentile else None
+    return OpenAIRuntime(
+        model='mock-model',
+        base_url=base_url,
+        api_key='mock-key',
+        temperature=0,
+        max_concurrency=args.concurrency,
+        adaptive_concurrency=adaptive,
+        hedging=hedging
+    )
+
+
+def make_model_config(base_url: str) -> Dict[str, Any]:
+    return {
+        "type": "openai",
+        "name": "mock-model",
+        "api_base": base_url,
+        "api_key": "mock-key",
+        "parameters": {"temperature": 0.7}
+    }
+
+
+async def bench_runtime(base_url: str, size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    runtime = make_runtime(base_url, args)
+    skill = make_skill()
+    data = make_reviews(size)
+
+    async def run(latencies: Dict[str, List[float]]) -> int:
+        instrument(runtime, latencies)
+        predictions = await runtime.run(skill, data)
+        return len(predictions)
+
+    return await measure("OpenAIRuntime.run", size, run, args.trace_memory)
+
+
+async def bench_model(base_url: str, size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from src.models.openai import OpenAIModel
+    from src.utils.helpers import create_prompt
+
+    model = OpenAIModel(make_model_config(base_url))
+    prompt = create_prompt("生成商品评论", [], num_samples=args.batch_size)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def generate() -> int:
+        async with semaphore:
+            return len(await model.generate(prompt))
+
+    async def run(latencies: Dict[str, List[float]]) -> int:
+        instrument(model, latencies)
+        calls = max(size // args.batch_size, 1)
+        counts = await asyncio.gather(*(generate() for _ in range(calls)))
+        return sum(counts)
+
+    return await measure("OpenAIModel.generate", size, run, args.trace_memory)
+
+
+async def bench_builder(base_url: str, size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from src.core.builder import DataBuilder
+    from src.core.config import TaskConfig, ModelConfig, SchemaConfig, SchemaField
+
+    task_config = TaskConfig(
+        description="生成中文情感分析数据集",
+        examples=[{"text": "这家餐厅的服务态度很好", "label": "正面"}],
+        schema=SchemaConfig(fields=[
+            SchemaField(name="text", type="string"),
+            SchemaField(name="label", type="string", choices=["正面", "负面", "中性"])
+        ])
+    )
+    builder = DataBuilder(task_config, ModelConfig(**make_model_config(base_url)))
+
+    async def run(latencies: Dict[str, List[float]]) -> int:
+        instrument(builder.model, latencies)
+        dataset = await builder.generate_dataset(
+            total_samples=size,
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency
+        )
+        return len(dataset)
+
+    return await measure("DataBuilder.generate_dataset", size, run, args.trace_memory)
+
+
+async def bench_agent(base_url: str, size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from src.core.agent import Agent
+    from src.environments.static import StaticEnvironment
+
+    runtime = make_runtime(base_url, args)
+    data = make_reviews(size)
+    agent = Agent(
+        skills=make_skill(),
+        environment=StaticEnvironment(df=data, ground_truth_columns={'sentiment': 'sentiment'}),
+        runtimes={'default': runtime}
+    )
+
+    async def run(latencies: Dict[str, List[float]]) -> int:
+        instrument(runtime, latencies)
+        await agent.learn(learning_iterations=args.learning_iterations)
+        return size * args.learning_iterations
+
+    return await measure("Agent.learn", size, run, args.trace_memory)
+
+
+BENCHMARKS = {
+    "runtime": bench_runtime,
+    "model": bench_model,
+    "builder": bench_builder,
+    "agent": bench_agent
+}
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    columns = ["entry_point", "size", "rows", "seconds", "rows_per_second",
+               "requests", "p50_ms", "p95_ms", "p99_ms", "wait_p50_ms", "wait_p99_ms",
+               "peak_memory_mb"]
+    print(pd.DataFrame(results, columns=columns).to_string(index=False))
+
+
+async def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    server_config = MockServerConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_seconds=args.retry_after,
+        seed=0
+    )
+    results = []
+    async with MockOpenAIServer(server_config) as server:
+        for name in args.entry_points:
+            for size in args.sizes:
+                result = await BENCHMARKS[name](server.base_url, size, args)
+                print(f"{result['entry_point']} size={size}: "
+                      f"{result['rows_per_second']} 行/秒, p99={result['p99_ms']}ms")
+                results.append(result)
+        await get_transport_registry().aclose()
+        print(f"\n模拟服务统计: {server.stats}\n")
+    print_table(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DataBuilder 端到端吞吐压测")
+    parser.add_argument("--entry-points", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--learning-iterations", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--adaptive-concurrency", action="store_true",
+                        help="运行时使用自适应并发上限，--concurrency 作为上限的最大值")
+    parser.add_argument("--hedge-percentile", type=float, default=None,
+                        help="运行时对耗时超过该延迟分位数的请求发出对冲请求")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false",
+                        help="不统计内存峰值（tracemalloc 会降低吞吐）")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    parser.add_argument("--metrics-output",
+                        help="保存 MetricsCollector 快照（.json 为 JSON，其他为 Prometheus 文本格式）")
+    parser.add_argument("--trace-output",
+                        help="把 span 追踪保存为 Chrome trace_event JSON（可在 chrome://tracing 中查看）")
+    args = parser.parse_args()
+
+    if args.trace_output:
+        enable_tracing(ChromeTraceExporter(args.trace_output))
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        if args.trace_output:
+            disable_tracing()
+    if args.metrics_output:
+        get_metrics_collector().export(args.metrics_output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
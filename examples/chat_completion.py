@@ -1,21 +1,29 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, Timeout
 
 # 加载环境变量
 load_dotenv()
 
-# 配置OpenAI客户端
-client = OpenAI(
-    base_url=os.getenv("OPENAI_API_BASE"),
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+_client = None
+
+
+def get_client() -> OpenAI:
+    """获取OpenAI客户端（首次使用时创建，所有请求复用同一个连接池）"""
+    global _client
+    if _client is None:
+        _client = OpenAI(
+            base_url=os.getenv("OPENAI_API_BASE"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=Timeout(60.0, connect=5.0)
+        )
+    return _client
 
 
 def chat_completion(messages: list):
     """获取对话回复"""
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=messages,
             stream=True
@@ -75,4 +83,8 @@ def interactive_chat():
 
 
 if __name__ == "__main__":
-    interactive_chat()
+    try:
+        interactive_chat()
+    finally:
+        if _client is not None:
+            _client.close()
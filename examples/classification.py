@@ -11,6 +11,7 @@ from src.environments.static import StaticEnvironment
 
 from src.skills.classification import ClassificationSkill
 from src.runtimes.openai import OpenAIRuntime
+from src.core.runtime import RuntimeManager
 
 
 # 加载环境变量
@@ -35,6 +36,18 @@ test_df = pd.DataFrame([
 
 
 async def main():
+    # 运行时管理器退出时关闭所有运行时共享的连接池
+    async with RuntimeManager() as manager:
+        manager.register_runtime('default', OpenAIRuntime(
+            model='gpt-4o-mini',
+            base_url=os.getenv('OPENAI_API_BASE'),
+            api_key=os.getenv('OPENAI_API_KEY'),
+            temperature=0.7
+        ))
+        await train(manager.runtimes)
+
+
+async def train(runtimes):
     agent = Agent(
         skills=ClassificationSkill(
             name='sentiment',
@@ -47,14 +60,7 @@ async def main():
             df=train_df,
             ground_truth_columns={'sentiment': 'sentiment'}
         ),
-        runtimes={
-            'default': OpenAIRuntime(
-                model='gpt-4o-mini',
-                base_url=os.getenv('OPENAI_API_BASE'),
-                api_key=os.getenv('OPENAI_API_KEY'),
-                temperature=0.7
-            )
-        }
+        runtimes=runtimes
     )
 
     # 训练模型
@@ -6,6 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.core.builder import DataBuilder
 from src.core.config import TaskConfig, ModelConfig, SchemaConfig, SchemaField
+from src.core.runtime import get_transport_registry
 
 async def main():
     # 配置任务
@@ -42,7 +43,11 @@ async def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 生成数据
-    data = await builder.generate(batch_size=10)
+    try:
+        data = await builder.generate(batch_size=10)
+    finally:
+        # 关闭共享连接池
+        await get_transport_registry().aclose()
     
     # 保存数据
     builder.save_dataset(data, str(output_path))
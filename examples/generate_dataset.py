@@ -1,6 +1,7 @@
 import asyncio
 from pathlib import Path
 from src.core.builder import DataBuilder
+from src.core.runtime import get_transport_registry
 from src.utils.helpers import load_yaml_config
 
 
@@ -14,16 +15,19 @@ async def main():
         model_config=config['model']
     )
     
-    # 生成数据集
-    dataset = await builder.generate_dataset(
-        total_samples=config['generation']['total_samples'],
-        batch_size=config['generation']['batch_size']
-    )
-    
-    # 保存数据集
-    output_path = Path('output/dataset.json')
+    # 生成数据集：逐批写入 JSONL 文件，中断后重新运行会从已生成的数据继续
+    output_path = Path('output/dataset.jsonl')
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    builder.save_dataset(dataset, str(output_path))
+    try:
+        await builder.generate_dataset(
+            total_samples=config['generation']['total_samples'],
+            batch_size=config['generation']['batch_size'],
+            output_path=str(output_path),
+            resume=True
+        )
+    finally:
+        # 关闭共享连接池
+        await get_transport_registry().aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
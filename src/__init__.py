@@ -1,6 +1,24 @@
-from .core.builder import DataBuilder
-from .core.schema import Schema
-from .core.validator import DataValidator
+import importlib
 
 __version__ = '0.1.0'
-__all__ = ['DataBuilder', 'Schema', 'DataValidator']
\ No newline at end of file
+__all__ = ['DataBuilder', 'Schema', 'DataValidator']
+
+# 公开名称 -> 所在模块，首次访问时才导入（避免导入包时加载 openai、pandas 等依赖）
+_LAZY_ATTRIBUTES = {
+    'DataBuilder': '.core.builder',
+    'Schema': '.core.schema',
+    'DataValidator': '.core.validator',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
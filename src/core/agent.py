@@ -1,8 +1,18 @@
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union, AsyncIterator
+import asyncio
+import copy
 import pandas as pd
 from src.skills.base import BaseSkill
+from src.skills.labels import LabelMatcher
 from src.environments.base import BaseEnvironment
-from src.runtimes.base import BaseRuntime
+from src.runtimes.base import BaseRuntime, ERROR_OUTPUT
+from src.core.evaluation import RacingEvaluator
+from src.core.optimization import BeamSearchOptimizer
+from src.core.prompt_budget import PromptBudget
+from src.utils.metrics import get_metrics_collector
+from src.utils.chunks import ChunkSource
+from src.utils.ledger import JobLedger
+from src.utils.tracing import trace_span
 
 
 class Agent:
@@ -11,31 +21,59 @@ class Agent:
         skills: BaseSkill,
         environment: BaseEnvironment,
         runtimes: Dict[str, BaseRuntime],
-        default_runtime: str = 'default'
+        default_runtime: str = 'default',
+        evaluator: Optional[RacingEvaluator] = None,
+        optimizer: Optional[BeamSearchOptimizer] = None,
+        prompt_budget: Optional[PromptBudget] = None
     ):
         self.skills = skills
         self.environment = environment
         self.runtimes = runtimes
         self.default_runtime = default_runtime
+        # 设置后使用竞速评估代替在完整训练集上评估每个候选提示词
+        self.evaluator = evaluator
+        # 设置后使用束搜索，每轮并行生成和评估多个候选提示词
+        self.optimizer = optimizer
+        # 优化提示词中训练历史的 token 预算
+        self.prompt_budget = prompt_budget or PromptBudget(
+            model=getattr(runtimes.get(default_runtime), 'model', None)
+        )
         self.best_accuracy = 0
         self.best_instructions = None
         self.training_history = []
+        # 提示词 -> 已预测行的标签，用于记录竞速评估和束搜索的训练历史
+        self._scored_predictions: Dict[str, pd.Series] = {}
         
     async def learn(self, learning_iterations: int = 3) -> None:
         """训练模型"""
+        self._scored_predictions.clear()
+        with trace_span("agent.learn", iterations=learning_iterations):
+            if self.optimizer is not None:
+                await self._learn_beam(learning_iterations)
+            elif self.evaluator is not None:
+                await self._learn_racing(learning_iterations)
+            else:
+                await self._learn_full(learning_iterations)
+
+    async def _learn_full(self, learning_iterations: int) -> None:
+        """每轮在完整训练集上评估当前提示词和新提示词"""
         runtime = self.runtimes[self.default_runtime]
-        train_data = await self.environment.load_data()
+        with trace_span("agent.load_data"):
+            train_data = await self.environment.load_data()
         
         for i in range(learning_iterations):
             print(f"\n开始第 {i+1} 轮训练...")
             
             # 进行预测
-            raw_predictions = await runtime.run(self.skills, train_data)
-            predictions = self.skills.process_predictions(raw_predictions)
+            with trace_span("agent.predict", iteration=i + 1):
+                raw_predictions = await runtime.run(self.skills, train_data)
+                predictions = self.skills.process_predictions(raw_predictions)
             
             # 获取反馈
-            feedback = await self.environment.get_feedback(predictions)
+            with trace_span("agent.feedback", iteration=i + 1):
+                feedback = await self.environment.get_feedback(predictions)
             accuracy = list(feedback.values())[0]
+            self._record_history(self.skills.instructions, accuracy, predictions, train_data)
             
             print(f"训练准确率: {feedback}")
             
@@ -45,9 +83,10 @@ class Agent:
                 
                 # 使用新提示词进行测试
                 self.skills.instructions = new_instructions
-                test_raw_predictions = await runtime.run(self.skills, train_data)
-                test_predictions = self.skills.process_predictions(test_raw_predictions)
-                test_feedback = await self.environment.get_feedback(test_predictions)
+                with trace_span("agent.evaluate", iteration=i + 1):
+                    test_raw_predictions = await runtime.run(self.skills, train_data)
+                    test_predictions = self.skills.process_predictions(test_raw_predictions)
+                    test_feedback = await self.environment.get_feedback(test_predictions)
                 test_accuracy = list(test_feedback.values())[0]
                 
                 # 只有当新提示词效果更好时才保留
@@ -59,9 +98,156 @@ class Agent:
                     print(f"保留原提示词: {test_accuracy} <= {accuracy}")
                     self.skills.instructions = old_instructions
     
-    async def _optimize_instructions(self, accuracy: float) -> str:
-        """优化提示词"""
+    async def _learn_racing(self, learning_iterations: int) -> None:
+        """使用竞速评估训练：在分层子样本上比较候选，明显更差的提前淘汰"""
+        train_data = await self.environment.load_data()
+        gt_col = list(self.environment.config.ground_truth_columns.values())[0]
+        labels = train_data[gt_col]
+        self.evaluator.reset()
+
+        for i in range(learning_iterations):
+            print(f"\n开始第 {i+1} 轮训练...")
+            old_instructions = self.skills.instructions
+
+            # 当前提示词在完整训练集上的准确率（已评估过的行不会重复预测）
+            accuracy = await self.evaluator.evaluate(
+                old_instructions, train_data, labels, self._score_instructions
+            )
+            print(f"训练准确率: {accuracy}")
+            self._record_scored(old_instructions, accuracy, train_data)
+
+            if accuracy < 1.0:
+                new_instructions = await self._optimize_instructions(accuracy)
+                scores = await self.evaluator.race(
+                    [old_instructions, new_instructions],
+                    train_data, labels, self._score_instructions
+                )
+                test_accuracy = scores.get(new_instructions)
+                old_accuracy = scores.get(old_instructions)
+
+                # 只有当新提示词效果更好时才保留
+                if test_accuracy is not None and (
+                    old_accuracy is None or test_accuracy > old_accuracy
+                ):
+                    if old_accuracy is None:
+                        print(f"新提示词效果更好: {test_accuracy}，原提示词已提前淘汰")
+                    else:
+                        print(f"新提示词效果更好: {test_accuracy} > {old_accuracy}")
+                    self.skills.instructions = new_instructions
+                    self.best_accuracy = test_accuracy
+                    self.best_instructions = new_instructions
+                elif test_accuracy is None:
+                    print(f"保留原提示词: {old_accuracy}，新提示词已提前淘汰")
+                else:
+                    print(f"保留原提示词: {test_accuracy} <= {old_accuracy}")
+
+        print(f"评估共预测 {self.evaluator.rows_evaluated} 行")
+
+    async def _learn_beam(self, learning_iterations: int) -> None:
+        """使用束搜索训练"""
+        train_data = await self.environment.load_data()
+        gt_col = list(self.environment.config.ground_truth_columns.values())[0]
+        labels = train_data[gt_col]
+        if self.evaluator is not None:
+            self.evaluator.reset()
+        candidate_limit = asyncio.Semaphore(self.optimizer.max_concurrent_candidates)
+
+        async def score_full(instructions: str) -> float:
+            async with candidate_limit:
+                correct = await self._score_instructions(instructions, train_data)
+            return float(correct.mean())
+
+        full_scores: Dict[str, float] = {}
+
+        async def score(candidates: List[str]) -> Dict[str, float]:
+            if self.evaluator is not None:
+                return await self.evaluator.race(
+                    candidates, train_data, labels, self._score_instructions
+                )
+            pending = [c for c in candidates if c not in full_scores]
+            results = await asyncio.gather(*(score_full(c) for c in pending))
+            full_scores.update(zip(pending, results))
+            return {c: full_scores[c] for c in candidates}
+
+        async def propose(parent: str, parent_score: float, n: int) -> str:
+            if n == 0:
+                self._record_scored(parent, parent_score, train_data)
+            return await self._optimize_instructions(
+                parent_score, instructions=parent, variant=n
+            )
+
+        best_instructions, best_accuracy = await self.optimizer.search(
+            self.skills.instructions, learning_iterations, propose, score
+        )
+        print(f"束搜索最佳得分: {best_accuracy}")
+        if best_instructions != self.skills.instructions:
+            self.skills.instructions = best_instructions
+            self.best_accuracy = best_accuracy
+            self.best_instructions = best_instructions
+
+    async def _score_instructions(self, instructions: str, data: pd.DataFrame) -> pd.Series:
+        """使用指定提示词预测数据，返回逐行是否正确"""
         runtime = self.runtimes[self.default_runtime]
+        skill = copy.copy(self.skills)
+        skill.instructions = instructions
+        with trace_span("agent.score", rows=len(data)):
+            raw_predictions = await runtime.run(skill, data)
+            predictions = skill.process_predictions(raw_predictions)
+            labels = predictions[self._prediction_column()]
+            known = self._scored_predictions.get(instructions)
+            self._scored_predictions[instructions] = (
+                labels if known is None else pd.concat([known, labels])
+            )
+            return self.environment.get_row_feedback(predictions)
+
+    def _prediction_column(self) -> str:
+        return list(self.environment.config.ground_truth_columns.keys())[0]
+
+    def _record_history(
+        self,
+        instructions: str,
+        accuracy: float,
+        predictions: pd.DataFrame,
+        data: pd.DataFrame
+    ) -> None:
+        """记录一轮训练：提示词、准确率以及每行的输入、预测和真实标签"""
+        pred_col, gt_col = list(self.environment.config.ground_truth_columns.items())[0]
+        rows = data.loc[predictions.index]
+        input_columns = [c for c in rows.columns if c not in self.environment.config.ground_truth_columns.values()]
+        frame = rows[input_columns].copy()
+        frame['prediction'] = predictions[pred_col]
+        frame['ground_truth'] = rows[gt_col]
+        self.training_history.append({
+            'iteration': len(self.training_history) + 1,
+            'instructions': instructions,
+            'accuracy': accuracy,
+            'predictions': frame
+        })
+
+    def _record_scored(self, instructions: str, accuracy: float, data: pd.DataFrame) -> None:
+        """用评估时缓存的预测记录训练历史（同一提示词连续出现时只记录一次）"""
+        labels = self._scored_predictions.get(instructions)
+        if labels is None:
+            return
+        if self.training_history and self.training_history[-1]['instructions'] == instructions:
+            return
+        predictions = labels.to_frame(self._prediction_column())
+        self._record_history(instructions, accuracy, predictions, data)
+
+    async def _optimize_instructions(
+        self,
+        accuracy: float,
+        instructions: Optional[str] = None,
+        variant: Optional[int] = None
+    ) -> str:
+        """优化提示词
+        Args:
+            accuracy: 当前提示词的准确率
+            instructions: 要优化的提示词，默认为技能当前的提示词
+            variant: 并行生成多个候选时的候选编号，用于要求不同的改写方向
+        """
+        runtime = self.runtimes[self.default_runtime]
+        instructions = instructions or self.skills.instructions
         
         # 获取技能的配置信息
         skill_config = {
@@ -73,7 +259,7 @@ class Agent:
         # 构建优化提示
         optimization_prompt = f"""
 ## 当前配置
-- 提示词: {self.skills.instructions}
+- 提示词: {instructions}
 - 输入模板: {skill_config['input_template']}
 - 输出模板: {skill_config['output_template']}
 - 可用标签: {skill_config['labels']}
@@ -92,53 +278,130 @@ class Agent:
 
 请直接返回优化后的提示词，不要包含任何解释。
 """
+        if variant:
+            optimization_prompt += f"\n这是第 {variant + 1} 个候选，请尝试与常规改写不同的优化方向。\n"
         
+        self._report_prompt_size(optimization_prompt)
+
         # 获取优化建议
-        new_instructions = await runtime.run_raw(optimization_prompt)
+        with trace_span("agent.optimize", variant=variant):
+            new_instructions = await runtime.run_raw(optimization_prompt)
         return new_instructions.strip()
 
     def get_optimized_prompt(self) -> str:
         """获取最佳提示词"""
         return self.best_instructions or self.skills.instructions
         
-    async def run(self, data: pd.DataFrame) -> pd.DataFrame:
-        """预测新数据"""
+    async def run(
+        self,
+        data: pd.DataFrame,
+        job_id: Optional[str] = None,
+        ledger: Optional[JobLedger] = None,
+        checkpoint_rows: int = 1000
+    ) -> pd.DataFrame:
+        """预测新数据
+
+        指定 job_id 时每完成 checkpoint_rows 行就把结果写入进度记录，
+        以相同 job_id 重新运行会跳过已完成的行，最后合并所有行的结果返回。
+        处理失败的行不写入进度记录，任务保持未完成状态，重新运行时只重试这些行。
+        Args:
+            data: 输入数据，指定 job_id 时索引必须唯一
+            job_id: 任务标识
+            ledger: 进度记录，默认使用 .cache/jobs.sqlite
+            checkpoint_rows: 每次提交进度的行数
+        """
+        runtime = self.runtimes[self.default_runtime]
+        if job_id is None:
+            return await runtime.run(self.skills, data)
+        if not data.index.is_unique:
+            raise ValueError("断点续跑要求输入数据的索引唯一")
+
+        own_ledger = ledger is None
+        ledger = ledger or JobLedger()
+        try:
+            with trace_span("agent.run_job", job_id=job_id, rows=len(data)):
+                return await self._run_job(runtime, data, job_id, ledger, checkpoint_rows)
+        finally:
+            if own_ledger:
+                ledger.close()
+
+    async def _run_job(
+        self,
+        runtime: BaseRuntime,
+        data: pd.DataFrame,
+        job_id: str,
+        ledger: JobLedger,
+        checkpoint_rows: int
+    ) -> pd.DataFrame:
+        skill = self.skills
+        # 模型和温度不同的结果不能混用
+        ledger.start(job_id, ledger.fingerprint(
+            skill.name, skill.instructions, skill.input_template,
+            skill.output_template, skill.labels, list(data.columns),
+            getattr(runtime, 'model', None), getattr(runtime, 'temperature', None)
+        ), len(data))
+
+        keys = [ledger.row_key(row_id) for row_id in data.index]
+        done = ledger.completed_keys(job_id)
+        remaining = data[[key not in done for key in keys]]
+        if len(remaining) < len(data):
+            print(f"任务 {job_id}: 跳过已完成的 {len(data) - len(remaining)} 行，剩余 {len(remaining)} 行")
+
+        failed: Dict[str, Dict[str, Any]] = {}
+        async for predictions in runtime.run_chunked(skill, remaining, chunk_size=checkpoint_rows):
+            # 只记录成功的行，失败的行在重新运行时重试
+            ok = ~(predictions == ERROR_OUTPUT).any(axis=1)
+            records = predictions[ok].to_dict(orient='records')
+            ledger.record(job_id, zip(predictions.index[ok], records))
+            for row_id, record in zip(predictions.index[~ok], predictions[~ok].to_dict(orient='records')):
+                failed[ledger.row_key(row_id)] = record
+            get_metrics_collector().inc("agent_job_rows_total", len(records), skill=skill.name)
+
+        # 合并进度记录中的结果，按输入顺序返回
+        outputs = ledger.outputs(job_id, keys)
+        outputs.update(failed)
+        missing = [key for key in keys if key not in outputs]
+        if missing:
+            raise ValueError(f"任务 {job_id} 有 {len(missing)} 行没有结果")
+        if failed:
+            # 任务保持未完成状态，以相同 job_id 重新运行只处理失败的行
+            print(f"任务 {job_id}: {len(failed)} 行处理失败，重新运行将重试这些行")
+        else:
+            ledger.finish(job_id)
+        return pd.DataFrame([outputs[key] for key in keys], index=data.index)
+
+    async def run_chunked(self, source: ChunkSource, **kwargs) -> AsyncIterator[pd.DataFrame]:
+        """分块预测新数据，逐块返回结果，参数见 BaseRuntime.run_chunked"""
+        runtime = self.runtimes[self.default_runtime]
+        async for predictions in runtime.run_chunked(self.skills, source, **kwargs):
+            yield predictions
+
+    async def run_to_file(self, source: ChunkSource, output_path: str, **kwargs) -> int:
+        """分块预测新数据并写入 JSONL 文件，参数见 BaseRuntime.write_chunked"""
         runtime = self.runtimes[self.default_runtime]
-        return await runtime.run(self.skills, data)
+        return await runtime.write_chunked(self.skills, source, output_path, **kwargs)
 
     def _validate_predictions(self, predictions: pd.DataFrame) -> bool:
         """验证预测结果格式"""
         # 获取输出列名
         output_column = list(self.skills.labels.keys())[0]
-        output_template = self.skills.output_template
-        valid_labels = self.skills.labels[output_column]
-        
-        # 从输出模板中提取前缀
-        prefix = output_template.split('{')[0].strip()
-        
-        for pred in predictions[output_column]:
-            # 检查是否符合输出模板格式
-            if not pred.startswith(prefix):
-                return False
-            # 检查是否使用了有效标签
-            label = pred.replace(prefix, '').strip()
-            if label not in valid_labels:
-                return False
-        return True
+        matcher = getattr(self.skills, 'label_matcher', None) or LabelMatcher.from_skill(self.skills)
+        # 每行都要符合 "输出模板前缀 + 有效标签" 的格式
+        return bool(matcher.is_exact(predictions[output_column]).all())
 
     def _format_training_history(self) -> str:
-        """格式化训练历史数据"""
+        """在 token 预算内格式化训练历史数据"""
         if not self.training_history:
             return "暂无训练历史"
-        
-        formatted_history = []
-        for record in self.training_history:
-            formatted_history.append(f"""
-### 迭代 {record['iteration']}
-- 提示: {record['instructions']}
-- 准确率: {record['accuracy']}
-- 预测结果:
-{record['predictions'].to_string()}
-""")
-        
-        return "\n".join(formatted_history)
\ No newline at end of file
+        return self.prompt_budget.format_history(self.training_history)
+
+    def _report_prompt_size(self, prompt: str) -> None:
+        """输出并记录优化提示词的 token 数"""
+        tokens = self.prompt_budget.count(prompt)
+        report = self.prompt_budget.last_report if self.training_history else {}
+        get_metrics_collector().observe(
+            "agent_optimization_prompt_tokens", tokens,
+            buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+        )
+        print(f"优化提示词: {tokens} tokens（训练历史 {report.get('history_tokens', 0)} tokens，"
+              f"{report.get('iterations', 0)} 轮，{report.get('examples', 0)} 条错误样本）")
\ No newline at end of file
@@ -1,13 +1,20 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 import asyncio
+from ..models import create_model
 from ..models.base import BaseModel
-from ..models.openai import OpenAIModel
-from ..models.llama import LlamaModel
 from .schema import Schema
 from .validator import DataValidator
-from ..utils.helpers import create_prompt, save_json_data
-from typing import Dict, Any, List
-from .config import TaskConfig, ModelConfig
+from ..utils.helpers import create_prompt, save_json_data, save_jsonl_data
+from ..utils.sink import JSONLDatasetWriter
+from ..utils.columnar import is_columnar_path
+from ..utils.metrics import get_metrics_collector
+from ..utils.tracing import trace_span
+from ..utils.offload import CPUOffloader, get_offloader
+import os
+from .config import TaskConfig, ModelConfig, SchemaField
+
+if TYPE_CHECKING:
+    from ..utils.dedup import NearDuplicateIndex
 
 
 class DataBuilder:
@@ -17,44 +24,241 @@ class DataBuilder:
         self.schema = Schema(task_config.schema.fields)
         self.validator = DataValidator(self.schema)
         self.model = self._init_model()
+        self.dedup_index = self._init_dedup_index()
+        self.metrics = get_metrics_collector()
+        self.offloader = self._init_offloader()
     
     def _init_model(self) -> BaseModel:
         """初始化模型"""
-        model_type = self.model_config.type.lower()
-        if model_type == 'openai':
-            return OpenAIModel(self.model_config.dict())
-        elif model_type == 'llama':
-            return LlamaModel(self.model_config.dict())
-        else:
-            raise ValueError(f"不支持的模型类型: {model_type}")
+        return create_model(self.model_config.type, self.model_config.dict())
+
+    def _init_offloader(self) -> CPUOffloader:
+        """初始化后处理执行器，与模型使用同一配置"""
+        offload = self.model_config.offload
+        return get_offloader(offload.mode, offload.max_workers) if offload else get_offloader()
+
+    def _init_dedup_index(self) -> Optional['NearDuplicateIndex']:
+        """初始化去重索引，配置了 index_path 且文件存在时从磁盘加载"""
+        dedup_config = self.task_config.dedup
+        if dedup_config is None:
+            return None
+        from ..utils.dedup import NearDuplicateIndex
+        index_path = dedup_config.index_path
+        if index_path and os.path.exists(NearDuplicateIndex.index_file(index_path)):
+            index = NearDuplicateIndex.load(index_path)
+            print(f"已加载去重索引: {len(index)} 条数据")
+            return index
+
+        fields = dedup_config.fields or [
+            field.name for field in self.schema.fields if field.type.lower() == 'string'
+        ]
+        if not fields:
+            raise ValueError("去重需要至少一个文本字段")
+        return NearDuplicateIndex(
+            fields,
+            threshold=dedup_config.threshold,
+            num_perm=dedup_config.num_perm,
+            ngram=dedup_config.ngram,
+            exact=dedup_config.exact
+        )
+
+    def _is_new(self, item: Dict[str, Any]) -> bool:
+        """未启用去重或不是重复数据时返回 True，新数据会加入索引"""
+        return self.dedup_index is None or self.dedup_index.add(item)
     
     async def generate_batch(self, batch_size: int) -> List[Dict[str, Any]]:
         """生成一批数据"""
         prompt = create_prompt(
             self.task_config.description,
-            self.task_config.examples
+            self.task_config.examples,
+            num_samples=batch_size
         )
         
-        response = await self.model.generate(prompt)
-        # 这里需要解析模型返回的文本，转换为结构化数据
-        # 具体实现取决于模型输出格式
-        
-        # 验证并过滤数据
-        valid_data = self.validator.filter_valid_items(response)
-        return valid_data[:batch_size]
+        with trace_span("builder.generate_batch", size=batch_size), \
+                self.metrics.timer("builder_batch_duration_seconds"):
+            if getattr(self.model, 'stream', False):
+                return await self._generate_batch_stream(prompt, batch_size)
+
+            response = await self.model.generate(prompt)
+            # 这里需要解析模型返回的文本，转换为结构化数据
+            # 具体实现取决于模型输出格式
+            
+            # 验证并过滤数据
+            filtered = await self.validator.filter_valid_items_async(response, self.offloader)
+            self.metrics.inc("builder_samples_total", len(response) - len(filtered), status="invalid")
+            # 模型多返回的有效数据单独统计，不算作无效数据
+            valid_data = filtered[:batch_size]
+            self.metrics.inc("builder_samples_total", len(filtered) - len(valid_data), status="surplus")
+            if self.dedup_index is not None:
+                with trace_span("builder.dedup", items=len(valid_data)):
+                    unique_data = self.dedup_index.filter(valid_data)
+                self.metrics.inc("builder_samples_total", len(valid_data) - len(unique_data), status="duplicate")
+                valid_data = unique_data
+            self.metrics.inc("builder_samples_total", len(valid_data), status="valid")
+            return valid_data
+
+    async def _generate_batch_stream(self, prompt: str, batch_size: int) -> List[Dict[str, Any]]:
+        """流式生成一批数据，逐条验证，凑够 batch_size 条后提前结束"""
+        valid_data = []
+        stream = self.model.generate_stream(prompt)
+        try:
+            async for item in stream:
+                if not self.validator.is_valid(item):
+                    self.metrics.inc("builder_samples_total", status="invalid")
+                elif not self._is_new(item):
+                    self.metrics.inc("builder_samples_total", status="duplicate")
+                else:
+                    self.metrics.inc("builder_samples_total", status="valid")
+                    valid_data.append(item)
+                    if len(valid_data) >= batch_size:
+                        break
+        except Exception as e:
+            # 中途出错时保留已经通过验证的数据
+            if not valid_data:
+                raise
+            print(f"流式生成中断，保留已生成的 {len(valid_data)} 条数据: {str(e)}")
+        finally:
+            await stream.aclose()
+        return valid_data
     
-    async def generate_dataset(self, total_samples: int, batch_size: int = 10) -> List[Dict[str, Any]]:
-        """生成完整数据集"""
-        dataset = []
-        while len(dataset) < total_samples:
-            batch = await self.generate_batch(batch_size)
-            dataset.extend(batch)
-        return dataset[:total_samples]
+    async def generate_dataset(
+        self,
+        total_samples: int,
+        batch_size: int = 10,
+        max_concurrency: int = 4,
+        max_failed_batches: int = 10,
+        output_path: Optional[str] = None,
+        resume: bool = False
+    ) -> List[Dict[str, Any]]:
+        """生成完整数据集
+
+        同时保持最多 max_concurrency 个批次请求在途，每个请求只索取距离
+        total_samples 仍缺少的条数；达到目标后取消多余的请求。失败或没有
+        产出有效数据的批次累计达到 max_failed_batches 次时停止生成，并返回
+        已经得到的数据。
+
+        指定 output_path 时，每批验证通过的数据立即追加写入文件，内存中
+        不保留数据集，返回空列表。.parquet / .arrow / .feather 后缀按 schema
+        写入列式文件（按 row group 缓存写出），其他后缀写入 JSONL；resume=True
+        时从 JSONL 文件中已提交的条数继续生成。
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency 必须大于 0: {max_concurrency}")
+        if resume and not output_path:
+            raise ValueError("resume=True 时必须指定 output_path")
+        if resume and is_columnar_path(output_path):
+            raise ValueError("列式文件不支持断点续写，请使用 JSONL 输出")
+
+        dataset: List[Dict[str, Any]] = []
+        writer = self._open_writer(output_path, resume) if output_path else None
+        produced = writer.count if writer else 0
+        if writer and produced:
+            print(f"从已有的 {produced} 条数据继续生成")
+            if self.dedup_index is not None and not len(self.dedup_index):
+                # 没有保存的索引时用已写入的数据重建
+                for item in writer.iter_items():
+                    self.dedup_index.add(item)
+
+        # 在途请求 -> 该请求索取的条数
+        pending: Dict[asyncio.Task, int] = {}
+        failed_batches = 0
+
+        try:
+            while produced < total_samples:
+                if failed_batches >= max_failed_batches:
+                    print(f"失败或空批次已达 {failed_batches} 次，停止生成，"
+                          f"已生成 {produced}/{total_samples} 条数据")
+                    break
+                # 按缺口补充在途请求，在途请求全部失败也不能超过失败次数上限
+                while len(pending) < max_concurrency and failed_batches + len(pending) < max_failed_batches:
+                    needed = total_samples - produced - sum(pending.values())
+                    if needed <= 0:
+                        break
+                    size = min(batch_size, needed)
+                    task = asyncio.ensure_future(self.generate_batch(size))
+                    pending[task] = size
+                self.metrics.set_gauge("builder_batches_in_flight", len(pending))
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    pending.pop(task)
+                    try:
+                        batch = task.result()
+                    except Exception as e:
+                        print(f"批次生成失败: {str(e)}")
+                        self.metrics.inc("builder_batches_total", status="failed")
+                        failed_batches += 1
+                        continue
+
+                    if not batch:
+                        self.metrics.inc("builder_batches_total", status="empty")
+                        failed_batches += 1
+                        continue
+                    self.metrics.inc("builder_batches_total", status="ok")
+                    batch = batch[:total_samples - produced]
+                    if writer:
+                        writer.write_batch(batch)
+                    else:
+                        dataset.extend(batch)
+                    produced += len(batch)
+                    self.metrics.inc("builder_samples_written_total", len(batch))
+        finally:
+            # 取消达到目标后仍在途的多余请求
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            self.metrics.set_gauge("builder_batches_in_flight", 0)
+            if writer:
+                writer.close(complete=produced >= total_samples)
+            self._finish_dedup()
+
+        return dataset
+
+    def _open_writer(self, output_path: str, resume: bool) -> Any:
+        """按后缀创建写入器"""
+        if is_columnar_path(output_path):
+            from ..utils.columnar import ColumnarDatasetWriter
+            return ColumnarDatasetWriter(output_path, self.task_config.schema.fields)
+        return JSONLDatasetWriter(output_path, resume=resume)
+
+    def _finish_dedup(self) -> None:
+        """输出重复率，配置了 index_path 时保存去重索引"""
+        if self.dedup_index is None:
+            return
+        stats = self.dedup_index.get_stats()
+        print(f"去重: 共检查 {stats['total']} 条，完全重复 {stats['exact_duplicates']} 条，"
+              f"近似重复 {stats['near_duplicates']} 条，重复率 {stats['duplicate_rate']:.2%}")
+        index_path = self.task_config.dedup.index_path
+        if index_path:
+            try:
+                self.dedup_index.save(index_path)
+            except Exception as e:
+                # 在 finally 中调用，不能掩盖生成结果或原始异常
+                print(f"保存去重索引出错: {str(e)}")
 
     @staticmethod
-    def save_dataset(data: List[Dict[str, Any]], output_path: str):
-        """保存数据集"""
-        save_json_data(data, output_path)
+    def save_dataset(
+        data: List[Dict[str, Any]],
+        output_path: str,
+        fields: Optional[List[SchemaField]] = None
+    ):
+        """保存数据集
+
+        .jsonl 后缀按行写入，.parquet / .arrow / .feather 后缀按 fields
+        推导的 schema 写入列式文件，其他按 JSON 数组写入。
+        """
+        if is_columnar_path(output_path):
+            if not fields:
+                raise ValueError("保存列式文件需要提供 schema 字段")
+            from ..utils.columnar import save_columnar_data
+            save_columnar_data(data, output_path, fields)
+        elif output_path.endswith('.jsonl'):
+            save_jsonl_data(data, output_path)
+        else:
+            save_json_data(data, output_path)
 
     async def validate_generation(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """验证生成的数据质量"""
@@ -65,20 +269,21 @@ class DataBuilder:
             "validation_errors": []
         }
         
-        valid_data = []
-        for item in data:
-            try:
-                if self.validator.is_valid(item):
-                    valid_data.append(item)
-                    metrics["valid"] += 1
-                else:
-                    metrics["invalid"] += 1
-                    metrics["validation_errors"].append(
-                        self.validator.get_error_messages(item)
-                    )
-            except Exception as e:
-                metrics["invalid"] += 1
-                metrics["validation_errors"].append(str(e))
+        items = [item for item in data if isinstance(item, dict)]
+        metrics["invalid"] = len(data) - len(items)
+        metrics["validation_errors"].extend(
+            ["数据不是JSON对象"] for _ in range(metrics["invalid"])
+        )
+
+        codes = self.validator.validate_batch(items)
+        row_ok = ~codes.any(axis=1)
+        valid_data = [item for item, ok in zip(items, row_ok) if ok]
+        metrics["valid"] = len(valid_data)
+        metrics["invalid"] += len(items) - len(valid_data)
+        for row_codes in codes[~row_ok]:
+            metrics["validation_errors"].append(
+                self.validator.compiled.describe(row_codes)
+            )
         
         return {
             "data": valid_data,
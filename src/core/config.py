@@ -1,21 +1,90 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, Field
 
 class SchemaField(BaseModel):
     name: str
     type: str
     choices: List[str] = []
+    required: bool = True
 
 class SchemaConfig(BaseModel):
     format: str = "json"
     fields: List[SchemaField]
 
+class DedupConfig(BaseModel):
+    # 参与去重的文本字段，为空时使用 schema 中所有 string 类型字段
+    fields: List[str] = []
+    threshold: float = 0.8
+    num_perm: int = 64
+    ngram: int = 3
+    exact: bool = True
+    # 索引文件路径（没有 .npz 后缀时自动添加），存在时加载，生成结束后保存
+    index_path: Optional[str] = None
+
 class TaskConfig(BaseModel):
     description: str
     examples: List[Dict[str, Any]]
     schema: SchemaConfig
+    dedup: Optional[DedupConfig] = None
+
+class CacheConfig(BaseModel):
+    path: str = ".cache/llm_responses.sqlite"
+    max_entries: Optional[int] = None
+    max_size_bytes: Optional[int] = None
+    ttl_seconds: Optional[float] = None
+    include_nondeterministic: bool = False
+
+class RateLimitConfig(BaseModel):
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+class TransportConfig(BaseModel):
+    # 连接池大小和空闲连接保持时间（秒）
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    # 超时（秒）
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 30.0
+
+class AdaptiveConcurrencyConfig(BaseModel):
+    # 并发上限的初始值和调整范围
+    initial_limit: int = 8
+    min_limit: int = 1
+    max_limit: int = 64
+    # 每轮增加的上限、拥塞时乘以的系数
+    increase: float = 1.0
+    decrease_factor: float = 0.5
+    # 延迟超过基线的倍数视为拥塞
+    latency_tolerance: float = 2.0
+
+class HedgingConfig(BaseModel):
+    # 请求耗时超过最近请求延迟的该分位数时发出对冲请求
+    percentile: float = 95.0
+    # 对冲请求占总请求数的上限
+    max_extra_ratio: float = 0.05
+    window: int = 500
+    min_samples: int = 20
+    min_delay_seconds: float = 0.05
+
+class OffloadConfig(BaseModel):
+    # inline：在事件循环中执行；thread / process：在线程池或进程池中执行
+    mode: str = "inline"
+    max_workers: Optional[int] = None
 
 class ModelConfig(BaseModel):
     type: str
     name: str
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
     parameters: Dict[str, Any] = Field(default_factory=dict)
+    stream: bool = False
+    cache: Optional[CacheConfig] = None
+    rate_limit: Optional[RateLimitConfig] = None
+    transport: Optional[TransportConfig] = None
+    # 同一端点共享的自适应并发上限
+    concurrency: Optional[AdaptiveConcurrencyConfig] = None
+    # JSON 解析和数据校验的执行方式
+    offload: Optional[OffloadConfig] = None
@@ -0,0 +1,119 @@
+"""
+提示词候选的竞速评估（successive halving）。
+
+候选提示词先在分层抽样的小样本上评分，用 Hoeffding 置信区间淘汰明显更差的
+候选，剩下的候选再在逐步扩大的样本上继续比较，只有难分高下的候选才会被
+评估到完整训练集。每个候选已经评过的行会被记住，样本扩大或再次参与比较时
+只预测新增的行。
+"""
+
+import asyncio
+import math
+from typing import Dict, List, Callable, Awaitable, Optional
+import numpy as np
+import pandas as pd
+
+
+class RacingEvaluator:
+    def __init__(
+        self,
+        initial_size: int = 32,
+        growth_factor: float = 2.0,
+        confidence: float = 0.95,
+        seed: int = 0
+    ):
+        if growth_factor <= 1:
+            raise ValueError(f"growth_factor 必须大于 1: {growth_factor}")
+        self.initial_size = initial_size
+        self.growth_factor = growth_factor
+        self.confidence = confidence
+        self.seed = seed
+        # 候选提示词 -> 已评估行的逐行正确性
+        self._correct: Dict[str, pd.Series] = {}
+        self._order: Optional[pd.Index] = None
+        self.rows_evaluated = 0
+
+    def stratified_order(self, labels: pd.Series) -> pd.Index:
+        """返回分层打乱后的行顺序，任意前缀中各标签的比例与全集一致"""
+        rng = np.random.default_rng(self.seed)
+        shuffled = labels.iloc[rng.permutation(len(labels))]
+        rank = shuffled.groupby(shuffled, sort=False).cumcount()
+        size = shuffled.groupby(shuffled, sort=False).transform('size')
+        # 每个标签内的行均匀分布在 [0, 1) 上
+        key = (rank + rng.random(len(shuffled))) / size
+        return key.sort_values(kind='stable').index
+
+    def reset(self) -> None:
+        """清空已记住的评估结果"""
+        self._correct.clear()
+        self._order = None
+
+    async def _extend(
+        self,
+        candidate: str,
+        data: pd.DataFrame,
+        rows: pd.Index,
+        score: Callable[[str, pd.DataFrame], Awaitable[pd.Series]]
+    ) -> pd.Series:
+        """确保候选在 rows 上都已评估，返回这些行的正确性"""
+        known = self._correct.get(candidate)
+        missing = rows if known is None else rows.difference(known.index, sort=False)
+        if len(missing):
+            result = (await score(candidate, data.loc[missing])).astype(bool)
+            self.rows_evaluated += len(missing)
+            known = result if known is None else pd.concat([known, result])
+            self._correct[candidate] = known
+        return known.loc[rows]
+
+    async def evaluate(
+        self,
+        candidate: str,
+        data: pd.DataFrame,
+        labels: pd.Series,
+        score: Callable[[str, pd.DataFrame], Awaitable[pd.Series]]
+    ) -> float:
+        """在完整训练集上评估单个候选，已评估过的行不会重复预测"""
+        if self._order is None or len(self._order) != len(data):
+            self._order = self.stratified_order(labels)
+        correct = await self._extend(candidate, data, self._order, score)
+        return float(correct.mean())
+
+    async def race(
+        self,
+        candidates: List[str],
+        data: pd.DataFrame,
+        labels: pd.Series,
+        score: Callable[[str, pd.DataFrame], Awaitable[pd.Series]]
+    ) -> Dict[str, float]:
+        """竞速评估候选提示词
+        Args:
+            candidates: 候选提示词
+            data: 训练数据
+            labels: 用于分层抽样的真实标签
+            score: 在给定数据上评估候选，返回逐行是否正确
+        Returns:
+            Dict: 未被淘汰的候选 -> 准确率估计（在相同的行上计算）
+        """
+        if self._order is None or len(self._order) != len(data):
+            self._order = self.stratified_order(labels)
+        alive = list(dict.fromkeys(candidates))
+        total = len(self._order)
+        size = min(self.initial_size, total)
+        delta = 1 - self.confidence
+
+        while True:
+            rows = self._order[:size]
+            correct = await asyncio.gather(
+                *(self._extend(c, data, rows, score) for c in alive)
+            )
+            scores = {c: float(s.mean()) for c, s in zip(alive, correct)}
+            if size >= total or len(alive) == 1:
+                return scores
+
+            # Hoeffding 置信半径，按候选数做 Bonferroni 修正
+            radius = math.sqrt(math.log(2 * len(alive) / delta) / (2 * size))
+            best = max(scores.values())
+            alive = [c for c in alive if scores[c] + radius >= best - radius]
+            if len(alive) == 1:
+                return {alive[0]: scores[alive[0]]}
+            size = min(total, math.ceil(size * self.growth_factor))
@@ -0,0 +1,77 @@
+"""
+提示词的并行束搜索。
+
+每一轮从当前保留的 B 个父提示词出发，同时生成 K 个候选提示词并发评分，
+再从父提示词和候选中保留得分最高的 B 个作为下一轮的父提示词。
+生成和评分请求都经过同一个运行时，受运行时的并发上限约束；
+max_concurrent_candidates 进一步限制同时评分的候选数。
+"""
+
+import asyncio
+from typing import Dict, List, Tuple, Callable, Awaitable, Optional
+
+
+class BeamSearchOptimizer:
+    def __init__(
+        self,
+        beam_width: int = 2,
+        num_candidates: int = 4,
+        max_concurrent_candidates: Optional[int] = None
+    ):
+        if beam_width < 1 or num_candidates < 1:
+            raise ValueError("beam_width 和 num_candidates 必须大于 0")
+        self.beam_width = beam_width
+        self.num_candidates = num_candidates
+        self.max_concurrent_candidates = max_concurrent_candidates or num_candidates
+        self.history: List[Dict[str, float]] = []
+
+    async def search(
+        self,
+        initial: str,
+        rounds: int,
+        propose: Callable[[str, float, int], Awaitable[str]],
+        score: Callable[[List[str]], Awaitable[Dict[str, float]]]
+    ) -> Tuple[str, float]:
+        """执行束搜索
+        Args:
+            initial: 初始提示词
+            rounds: 搜索轮数
+            propose: 根据父提示词及其得分生成第 n 个候选
+            score: 为一组提示词评分，可以只返回未被淘汰的提示词
+        Returns:
+            Tuple: 最佳提示词及其得分
+        """
+        scores = await score([initial])
+        beam = [(initial, scores.get(initial, 0.0))]
+        limiter = asyncio.Semaphore(self.max_concurrent_candidates)
+
+        async def limited_propose(parent: str, parent_score: float, n: int) -> str:
+            async with limiter:
+                return (await propose(parent, parent_score, n)).strip()
+
+        for round_index in range(rounds):
+            best_score = beam[0][1]
+            print(f"\n开始第 {round_index + 1} 轮束搜索，当前最佳得分: {best_score}")
+            if best_score >= 1.0:
+                break
+
+            # 按父提示词平均分配 K 个候选名额，余下的名额给得分较高的父提示词
+            base, extra = divmod(self.num_candidates, len(beam))
+            proposals = await asyncio.gather(*(
+                limited_propose(parent, parent_score, n)
+                for i, (parent, parent_score) in enumerate(beam)
+                for n in range(base + (1 if i < extra else 0))
+            ))
+            parents = [parent for parent, _ in beam]
+            candidates = [c for c in dict.fromkeys(proposals) if c and c not in parents]
+            if not candidates:
+                print("没有生成新的候选提示词")
+                continue
+
+            scores = await score(parents + candidates)
+            self.history.append(scores)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            beam = ranked[:self.beam_width]
+            print(f"本轮评估 {len(candidates)} 个候选，保留得分: {[s for _, s in beam]}")
+
+        return beam[0]
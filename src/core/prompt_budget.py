@@ -0,0 +1,153 @@
+"""
+优化提示词中训练历史的 token 预算。
+
+训练历史按从新到旧的顺序放入预算：
+1. 每轮的提示词、准确率，以及按标签统计的正确数和最常见的混淆（真实 -> 预测）
+2. 预算有剩余时，从各混淆类型中轮流抽取错误样本
+超出预算的更早轮次和样本会被丢弃，只保留最近 max_iterations 轮。
+"""
+
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+from src.utils.tokens import count_tokens
+
+
+class PromptBudget:
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        max_iterations: int = 3,
+        max_examples: int = 8,
+        max_confusions: int = 5,
+        max_example_chars: int = 200,
+        model: Optional[str] = None,
+        seed: int = 0
+    ):
+        """
+        Args:
+            max_tokens: 训练历史可以占用的 token 数
+            max_iterations: 最多保留最近几轮
+            max_examples: 每轮最多列出的错误样本数
+            max_confusions: 每轮最多列出的混淆类型数
+            max_example_chars: 单个样本输入的最大字符数，超出部分截断
+            model: 用于 token 计数的模型名称
+            seed: 抽样错误样本的随机种子
+        """
+        self.max_tokens = max_tokens
+        self.max_iterations = max_iterations
+        self.max_examples = max_examples
+        self.max_confusions = max_confusions
+        self.max_example_chars = max_example_chars
+        self.model = model
+        self.seed = seed
+        # 最近一次 format_history 的统计
+        self.last_report: Dict[str, int] = {}
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def _format_summary(self, record: Dict[str, Any]) -> str:
+        predictions: pd.DataFrame = record['predictions']
+        lines = [
+            f"### 迭代 {record['iteration']}",
+            f"- 提示: {record['instructions']}",
+            f"- 准确率: {record['accuracy']}"
+        ]
+        if len(predictions):
+            truth = predictions['ground_truth'].astype(str)
+            correct = predictions['prediction'].astype(str) == truth
+            per_label = correct.groupby(truth).agg(['sum', 'count'])
+            lines.append("- 各标签正确数: " + "，".join(
+                f"{label} {int(row['sum'])}/{int(row['count'])}"
+                for label, row in per_label.iterrows()
+            ))
+            confusions = self._confusions(predictions)
+            if len(confusions):
+                lines.append("- 主要混淆(真实 -> 预测): " + "，".join(
+                    f"{gt} -> {pred} {count} 次"
+                    for (gt, pred), count in confusions.head(self.max_confusions).items()
+                ))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _confusions(predictions: pd.DataFrame) -> pd.Series:
+        errors = predictions[predictions['prediction'].astype(str) != predictions['ground_truth'].astype(str)]
+        return errors.groupby(['ground_truth', 'prediction']).size().sort_values(ascending=False)
+
+    def _sample_errors(self, record: Dict[str, Any]) -> List[str]:
+        """从各混淆类型中轮流抽取错误样本，最常见的混淆优先"""
+        predictions: pd.DataFrame = record['predictions']
+        errors = predictions[predictions['prediction'].astype(str) != predictions['ground_truth'].astype(str)]
+        if not len(errors):
+            return []
+        rng = np.random.default_rng(self.seed + int(record['iteration']))
+        order = self._confusions(predictions).index
+        groups = {
+            key: group.iloc[rng.permutation(len(group))]
+            for key, group in errors.groupby(['ground_truth', 'prediction'])
+        }
+        input_columns = [c for c in predictions.columns if c not in ('prediction', 'ground_truth')]
+        lines: List[str] = []
+        depth = 0
+        while len(lines) < self.max_examples:
+            added = False
+            for key in order:
+                group = groups[key]
+                if depth < len(group) and len(lines) < self.max_examples:
+                    row = group.iloc[depth]
+                    text = "；".join(str(row[c]) for c in input_columns)
+                    if len(text) > self.max_example_chars:
+                        text = text[:self.max_example_chars] + "…"
+                    lines.append(f"- 输入: {text} | 预测: {row['prediction']} | 正确: {row['ground_truth']}")
+                    added = True
+            if not added:
+                break
+            depth += 1
+        return lines
+
+    def format_history(self, history: List[Dict[str, Any]]) -> str:
+        """在预算内格式化训练历史
+        Args:
+            history: 训练记录，每条包含 iteration、instructions、accuracy，
+                以及含 prediction、ground_truth 和输入列的 predictions
+        Returns:
+            str: 格式化后的训练历史
+        """
+        recent = history[-self.max_iterations:] if self.max_iterations else []
+        used = 0
+        sections: Dict[int, List[str]] = {}
+
+        # 从最新的一轮开始放入摘要
+        for index in range(len(recent) - 1, -1, -1):
+            summary = self._format_summary(recent[index])
+            cost = self.count(summary) + 1
+            if used + cost > self.max_tokens:
+                break
+            used += cost
+            sections[index] = [summary]
+
+        # 剩余预算依次放入各轮的错误样本
+        examples = 0
+        for index in sorted(sections, reverse=True):
+            lines = self._sample_errors(recent[index])
+            added: List[str] = []
+            for line in lines:
+                text = line if added else f"- 错误样本:\n{line}"
+                cost = self.count(text) + 1
+                if used + cost > self.max_tokens:
+                    break
+                used += cost
+                added.append(text)
+            sections[index].extend(added)
+            examples += len(added)
+
+        self.last_report = {
+            "history_tokens": used,
+            "iterations": len(sections),
+            "dropped_iterations": len(history) - len(sections),
+            "examples": examples
+        }
+        if not sections:
+            return "暂无训练历史"
+        return "\n\n".join("\n".join(sections[index]) for index in sorted(sections))
@@ -1,10 +1,114 @@
-from typing import Any
+import asyncio
+import sys
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from openai import DefaultAsyncHttpxClient
+from .config import TransportConfig
+
+
+def _sdk_httpx() -> Any:
+    """openai SDK 使用的 httpx 模块（新版 SDK 为 httpx2），Limits / Timeout 需要与客户端一致"""
+    for cls in DefaultAsyncHttpxClient.__mro__:
+        if cls.__name__ == 'AsyncClient':
+            return sys.modules[cls.__module__.split('.')[0]]
+    raise ImportError("无法确定 openai SDK 使用的 httpx 模块")
+
+
+class TransportRegistry:
+    """按端点共享的 HTTP 连接池
+
+    同一个端点（scheme://host:port）的所有运行时和模型共用一个 openai SDK 的 HTTP 客户端，
+    复用 keep-alive 连接，避免高并发时反复建立 TCP/TLS 连接。
+    连接池绑定到创建连接时的事件循环，因此按 (事件循环, 端点) 分别创建，
+    多次 asyncio.run 使用同一个运行时也不会复用已关闭事件循环上的连接。
+    事件循环结束前应调用 aclose()。
+    """
+
+    def __init__(self, default_config: Optional[TransportConfig] = None):
+        self.default_config = default_config or TransportConfig()
+        self._clients: Dict[Tuple[Optional[asyncio.AbstractEventLoop], str], DefaultAsyncHttpxClient] = {}
+
+    @staticmethod
+    def endpoint_key(base_url: Optional[str]) -> str:
+        """提取端点，路径不同但主机相同的 base_url 共用连接池"""
+        parts = urlsplit(base_url or "https://api.openai.com/v1")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return f"{parts.scheme}://{parts.hostname}:{port}"
+
+    @staticmethod
+    def _build_client(config: TransportConfig) -> DefaultAsyncHttpxClient:
+        httpx = _sdk_httpx()
+        return DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=config.connect_timeout,
+                read=config.read_timeout,
+                write=config.write_timeout,
+                pool=config.pool_timeout
+            ),
+            follow_redirects=True
+        )
+
+    def get_client(
+        self,
+        base_url: Optional[str],
+        config: Optional[TransportConfig] = None
+    ) -> DefaultAsyncHttpxClient:
+        """获取当前事件循环上端点的共享客户端，端点的连接池参数以首次创建时的配置为准"""
+        loop = _running_loop()
+        self._discard_closed_loops()
+        key = (loop, self.endpoint_key(base_url))
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._build_client(config or self.default_config)
+            self._clients[key] = client
+        return client
+
+    def _discard_closed_loops(self) -> None:
+        """丢弃已关闭事件循环上的客户端（无法再在原事件循环中关闭）"""
+        for key in [key for key in self._clients if key[0] is not None and key[0].is_closed()]:
+            del self._clients[key]
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的所有连接池"""
+        loop = _running_loop()
+        self._discard_closed_loops()
+        keys = [key for key in self._clients if key[0] in (loop, None)]
+        clients = [self._clients.pop(key) for key in keys]
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"关闭连接池出错: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+_transports = TransportRegistry()
+
+
+def get_transport_registry() -> TransportRegistry:
+    """获取进程内共享的连接池注册表"""
+    return _transports
 
 
 class RuntimeManager:
-    def __init__(self):
+    def __init__(self, transports: Optional[TransportRegistry] = None):
         self.runtimes = {}
         self.current_runtime = None
+        self.transports = transports or get_transport_registry()
     
     def register_runtime(self, name: str, runtime: Any):
         """注册新的运行时"""
@@ -15,3 +119,15 @@ class RuntimeManager:
         if name not in self.runtimes:
             raise ValueError(f"Runtime {name} not found")
         self.current_runtime = self.runtimes[name]
+
+    async def shutdown(self):
+        """关闭所有运行时共享的连接池"""
+        await self.transports.aclose()
+        self.runtimes.clear()
+        self.current_runtime = None
+
+    async def __aenter__(self) -> 'RuntimeManager':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.shutdown()
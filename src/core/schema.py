@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 
 
@@ -6,19 +6,219 @@ class Field(BaseModel):
     name: str
     type: str
     choices: List[str] = []
+    required: bool = True
+
+
+# 字段错误码
+FIELD_OK = 0
+FIELD_MISSING = 1
+FIELD_TYPE_ERROR = 2
+FIELD_CHOICE_ERROR = 3
+
+ERROR_MESSAGES = {
+    FIELD_MISSING: "缺少必填字段",
+    FIELD_TYPE_ERROR: "类型错误",
+    FIELD_CHOICE_ERROR: "取值不在可选范围内"
+}
+
+# schema 类型 -> Python 类型
+TYPE_MAPPING = {
+    "string": (str,),
+    "str": (str,),
+    "integer": (int,),
+    "int": (int,),
+    "number": (int, float),
+    "float": (int, float),
+    "boolean": (bool,),
+    "bool": (bool,),
+    "array": (list,),
+    "list": (list,),
+    "object": (dict,),
+    "dict": (dict,)
+}
+
+
+class CompiledField:
+    __slots__ = ('name', 'type', 'required', 'python_types', 'choices', 'choice_list')
+
+    def __init__(self, field: Any):
+        self.name = field.name
+        self.type = field.type.lower()
+        self.required = getattr(field, 'required', True)
+        # 未知类型不做类型检查
+        self.python_types: Optional[Tuple[type, ...]] = TYPE_MAPPING.get(self.type)
+        self.choice_list = list(field.choices or [])
+        self.choices = frozenset(self.choice_list)
+
+    def check(self, value: Any) -> int:
+        """检查单个值，返回错误码"""
+        if value is None:
+            return FIELD_MISSING if self.required else FIELD_OK
+        if self.python_types is not None:
+            # bool 是 int 的子类，数值类型需要单独排除
+            if not isinstance(value, self.python_types) or (
+                isinstance(value, bool) and bool not in self.python_types
+            ):
+                return FIELD_TYPE_ERROR
+        if self.choices:
+            try:
+                if value not in self.choices:
+                    return FIELD_CHOICE_ERROR
+            except TypeError:
+                # 不可哈希的值不可能在可选值中
+                return FIELD_CHOICE_ERROR
+        return FIELD_OK
+
+
+class CompiledSchema:
+    """预编译的 schema 校验器
+
+    字段的类型、可选值和必填信息在编译时准备好，单条校验只需遍历一次字段；
+    批量校验按列向量化执行，返回每行每个字段的错误码。
+    """
+
+    def __init__(self, fields: List[Any]):
+        self.fields = [CompiledField(field) for field in fields]
+        self.field_map: Dict[str, CompiledField] = {f.name: f for f in self.fields}
+
+    def check_item(self, item: Dict[str, Any]) -> List[int]:
+        """校验单条数据，返回各字段的错误码"""
+        return [field.check(item.get(field.name)) for field in self.fields]
+
+    def is_valid(self, item: Dict[str, Any]) -> bool:
+        """校验单条数据"""
+        for field in self.fields:
+            if field.check(item.get(field.name)) != FIELD_OK:
+                return False
+        return True
+
+    def validate_records(self, items: List[Dict[str, Any]]):
+        """批量校验字典列表，返回形状为 (行数, 字段数) 的错误码矩阵
+
+        各列保留原始值（object 类型），与 check_item 一样只有 None 视为缺失，
+        结果与逐条校验一致。
+        """
+        import pandas as pd
+
+        frame = pd.DataFrame(
+            {
+                field.name: pd.Series([item.get(field.name) for item in items], dtype=object)
+                for field in self.fields
+            },
+            index=pd.RangeIndex(len(items))
+        )
+        return self.validate_frame(frame, nan_is_missing=False)
+
+    def validate_frame(self, frame: Any, nan_is_missing: bool = True):
+        """按列向量化校验 DataFrame（或 pyarrow Table），返回错误码矩阵
+
+        默认按 pandas 的惯例把 NaN 视为缺失值；含缺失值的整数列会被转成浮点列，
+        因此整数字段也接受值为整数的浮点列。nan_is_missing=False 时只有 None 视为缺失。
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not isinstance(frame, pd.DataFrame) and hasattr(frame, 'to_pandas'):
+            frame = frame.to_pandas()
+
+        codes = np.zeros((len(frame), len(self.fields)), dtype=np.uint8)
+        for j, field in enumerate(self.fields):
+            if field.name not in frame.columns:
+                if field.required:
+                    codes[:, j] = FIELD_MISSING
+                continue
+
+            column = frame[field.name]
+            na = column.isna().to_numpy()
+            missing = na if nan_is_missing else np.equal(column.to_numpy(dtype=object), None)
+            present = ~missing
+            if field.required:
+                codes[missing, j] = FIELD_MISSING
+
+            if field.python_types is not None:
+                # 有不算缺失的 NaN 时不能按 dtype 判断
+                type_ok = self._column_type_ok(column, field, exact=not (na & present).any())
+                codes[present & ~type_ok, j] = FIELD_TYPE_ERROR
+
+            if field.choices:
+                try:
+                    choice_ok = column.isin(field.choice_list).to_numpy()
+                except TypeError:
+                    choice_ok = np.fromiter(
+                        (field.check(value) == FIELD_OK for value in column.to_numpy(dtype=object)),
+                        dtype=bool,
+                        count=len(column)
+                    )
+                codes[present & ~choice_ok & (codes[:, j] == FIELD_OK), j] = FIELD_CHOICE_ERROR
+        return codes
+
+    @staticmethod
+    def _column_type_ok(column: Any, field: CompiledField, exact: bool = True):
+        """检查一列的类型，能按 dtype 判断时不逐个检查元素
+
+        exact=False 时列中有需要当作取值检查的 NaN，不能按 dtype 判断。
+        """
+        import numpy as np
+        from pandas.api import types as ptypes
+
+        if column.dtype == object:
+            # 元素的类型都正好是字段允许的类型时整列通过（按 type 比较，bool 不会被当作 int）
+            if set(map(type, column.to_numpy())) <= {*field.python_types, type(None)}:
+                return np.ones(len(column), dtype=bool)
+
+        if exact:
+            if field.type in ("string", "str"):
+                if ptypes.is_string_dtype(column.dtype) and \
+                        ptypes.infer_dtype(column, skipna=True) in ("string", "empty"):
+                    return np.ones(len(column), dtype=bool)
+            elif field.type in ("integer", "int"):
+                if ptypes.is_bool_dtype(column.dtype):
+                    return np.zeros(len(column), dtype=bool)
+                if ptypes.is_integer_dtype(column.dtype):
+                    return np.ones(len(column), dtype=bool)
+                if ptypes.is_float_dtype(column.dtype):
+                    # 含缺失值的整数列会被 pandas 转成浮点列
+                    values = column.to_numpy(dtype=float, na_value=0.0)
+                    return np.floor(values) == values
+            elif field.type in ("number", "float"):
+                if ptypes.is_bool_dtype(column.dtype):
+                    return np.zeros(len(column), dtype=bool)
+                if ptypes.is_numeric_dtype(column.dtype):
+                    return np.ones(len(column), dtype=bool)
+            elif field.type in ("boolean", "bool"):
+                if ptypes.is_bool_dtype(column.dtype):
+                    return np.ones(len(column), dtype=bool)
+
+        # 混合类型的列逐个检查元素类型
+        return np.fromiter(
+            (value is None or field.check(value) != FIELD_TYPE_ERROR
+             for value in column.to_numpy(dtype=object)),
+            dtype=bool,
+            count=len(column)
+        )
+
+    def describe(self, codes: List[int]) -> List[str]:
+        """把一行的错误码转换为错误信息"""
+        return [
+            f"{field.name}: {ERROR_MESSAGES[code]}"
+            for field, code in zip(self.fields, codes)
+            if code != FIELD_OK
+        ]
 
 
 class Schema:
     def __init__(self, fields: List[Field]):
         self.fields = fields
-    
+        self._compiled: Optional[CompiledSchema] = None
+
+    def compile(self) -> CompiledSchema:
+        """编译 schema，结果会被缓存"""
+        if self._compiled is None:
+            self._compiled = CompiledSchema(self.fields)
+        return self._compiled
+
     def validate_field(self, field_name: str, value: Any) -> bool:
-        for field in self.fields:
-            if field.name == field_name:
-                if field.type == "string":
-                    if not isinstance(value, str):
-                        return False
-                    if field.choices and value not in field.choices:
-                        return False
-                return True
-        return False
+        field = self.compile().field_map.get(field_name)
+        if field is None:
+            return False
+        return field.check(value) == FIELD_OK
@@ -1,18 +1,57 @@
 from typing import List, Dict, Any
-from .schema import Schema
+from .schema import Schema, CompiledSchema
+from ..utils.offload import CPUOffloader
+from ..utils.tracing import trace_span
+
+
+def filter_valid_records(
+    compiled: CompiledSchema,
+    items: List[Any],
+    vectorize_threshold: int = 256
+) -> List[Dict[str, Any]]:
+    """过滤出通过校验的数据（模块级函数，可以提交到进程池）"""
+    items = [item for item in items if isinstance(item, dict)]
+    if len(items) < vectorize_threshold:
+        return [item for item in items if compiled.is_valid(item)]
+    valid = ~compiled.validate_records(items).any(axis=1)
+    return [item for item, ok in zip(items, valid) if ok]
 
 
 class DataValidator:
+    # 数据量不少于该值时使用按列向量化的批量校验
+    VECTORIZE_THRESHOLD = 256
+
     def __init__(self, schema: Schema):
         self.schema = schema
+        self.compiled = schema.compile()
     
     def is_valid(self, data: Dict[str, Any]) -> bool:
-        for field in self.schema.fields:
-            if field.name not in data:
-                return False
-            if not self.schema.validate_field(field.name, data[field.name]):
-                return False
-        return True
+        return self.compiled.is_valid(data)
+
+    def get_error_messages(self, data: Dict[str, Any]) -> List[str]:
+        """获取单条数据的校验错误信息"""
+        return self.compiled.describe(self.compiled.check_item(data))
+
+    def validate_batch(self, items: Any):
+        """批量校验，返回形状为 (行数, 字段数) 的错误码矩阵
+
+        items 可以是字典列表、DataFrame 或 pyarrow Table。
+        """
+        if isinstance(items, list):
+            return self.compiled.validate_records(items)
+        return self.compiled.validate_frame(items)
     
     def filter_valid_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        return [item for item in items if self.is_valid(item)]
+        with trace_span("validator.filter_valid_items", items=len(items)):
+            return filter_valid_records(self.compiled, items, self.VECTORIZE_THRESHOLD)
+
+    async def filter_valid_items_async(
+        self,
+        items: List[Dict[str, Any]],
+        offloader: CPUOffloader
+    ) -> List[Dict[str, Any]]:
+        """整批提交到 offloader 执行过滤"""
+        with trace_span("validator.filter_valid_items", items=len(items), mode=offloader.mode):
+            return await offloader.run(
+                filter_valid_records, self.compiled, items, self.VECTORIZE_THRESHOLD
+            )
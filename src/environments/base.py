@@ -30,3 +30,8 @@ class BaseEnvironment(ABC):
     async def get_feedback(self, predictions: Dict[str, Any]) -> Dict[str, float]:
         """获取预测反馈"""
         pass
+    
+    @abstractmethod
+    def get_row_feedback(self, predictions: pd.DataFrame) -> pd.Series:
+        """获取逐行反馈（是否预测正确），索引与 predictions 一致"""
+        pass
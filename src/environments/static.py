@@ -42,7 +42,21 @@ class StaticEnvironment(BaseEnvironment):
         """
         metrics = {}
         for pred_col, gt_col in self.config.ground_truth_columns.items():
-            # 直接比较预测值和真实值
-            accuracy = (predictions[pred_col] == self.config.df[gt_col]).mean()
+            # 按索引对齐后比较预测值和真实值，predictions 可以只包含部分行
+            ground_truth = self.config.df.loc[predictions.index, gt_col]
+            accuracy = (predictions[pred_col] == ground_truth).mean()
             metrics[f"{pred_col}_accuracy"] = accuracy
         return metrics
+
+    def get_row_feedback(self, predictions: pd.DataFrame) -> pd.Series:
+        """获取逐行反馈
+        Args:
+            predictions: 预测结果DataFrame，可以只包含部分行
+        Returns:
+            pd.Series: 每行是否预测正确（所有标注列都正确才算正确）
+        """
+        correct = pd.Series(True, index=predictions.index)
+        for pred_col, gt_col in self.config.ground_truth_columns.items():
+            ground_truth = self.config.df.loc[predictions.index, gt_col]
+            correct &= predictions[pred_col] == ground_truth
+        return correct
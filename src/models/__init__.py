@@ -0,0 +1,20 @@
+from typing import Any, Dict
+from ..utils.registry import LazyRegistry
+
+# 模型类型 -> 实现类，首次使用时才导入
+MODEL_REGISTRY = LazyRegistry('模型', entry_point_group='databuilder.models')
+MODEL_REGISTRY.register('openai', 'src.models.openai:OpenAIModel')
+MODEL_REGISTRY.register('llama', 'src.models.llama:LlamaModel')
+
+
+def register_model(name: str, target: Any) -> None:
+    """注册模型类型，target 可以是 "模块路径:类名" 或模型类"""
+    MODEL_REGISTRY.register(name, target)
+
+
+def create_model(model_type: str, model_config: Dict[str, Any]):
+    """根据类型创建模型"""
+    return MODEL_REGISTRY.get(model_type)(model_config)
+
+
+__all__ = ['MODEL_REGISTRY', 'register_model', 'create_model']
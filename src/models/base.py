@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 
 
 class BaseModel(ABC):
@@ -15,6 +15,11 @@ class BaseModel(ABC):
         """生成回复"""
         pass
     
+    async def generate_stream(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """逐条返回生成的数据，默认在完整生成后依次返回"""
+        for item in await self.generate(prompt):
+            yield item
+    
     @abstractmethod
     def validate_config(self) -> bool:
         """验证配置是否有效"""
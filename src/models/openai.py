@@ -1,66 +1,289 @@
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from contextlib import AsyncExitStack, nullcontext
 from .base import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI
 import os
+import time
 from pathlib import Path
-from ..utils.retry import retry_with_exponential_backoff
-from dotenv import load_dotenv
+from ..utils.retry import retry_with_exponential_backoff, get_retry_after
+from ..utils.cache import ResponseCache
+from ..utils.rate_limit import get_rate_limiter
+from ..utils.tokens import estimate_message_tokens
+from ..utils.json_stream import JSONArrayStreamParser, parse_json_items, parse_json_response
+from ..utils.offload import get_offloader
+from ..utils.concurrency import get_concurrency_limiter
+from ..core.config import TransportConfig, AdaptiveConcurrencyConfig
+from ..core.runtime import get_transport_registry, TransportRegistry
+from ..utils.metrics import get_metrics_collector
+from ..utils.tracing import trace_span
 
 
-# 加载环境变量
-env_path = Path('.env')
-if not env_path.exists():
-    raise FileNotFoundError("未找到 .env 文件，请根据 .env.example 创建配置文件")
+_env_loaded = False
 
-load_dotenv(dotenv_path=env_path, override=True)
+
+def _load_env() -> None:
+    """加载当前目录的 .env 文件（只在需要从环境变量读取配置时加载一次）"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    env_path = Path('.env')
+    if env_path.exists():
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=env_path, override=True)
 
 
 class OpenAIModel(BaseModel):
     def __init__(self, model_config: Dict[str, Any]):
         super().__init__(model_config)
-        self.client = OpenAI(
-            base_url=model_config.get('api_base') or os.getenv("OPENAI_API_BASE"),
-            api_key=model_config.get('api_key') or os.getenv("OPENAI_API_KEY")
-        )
+        if not (model_config.get('api_base') and model_config.get('api_key')):
+            _load_env()
+        base_url = model_config.get('api_base') or os.getenv("OPENAI_API_BASE")
+        self.base_url = base_url
+        self.api_key = model_config.get('api_key') or os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("未配置 API 密钥，请在模型配置中设置 api_key，"
+                             "或根据 .env.example 创建 .env 文件")
+        # 同一端点的运行时和模型共享连接池
+        transport_config = model_config.get('transport')
+        self.transport = TransportConfig(**transport_config) if transport_config else None
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client = None
         self.model_name = model_config.get('name', 'gpt-4')
         self.parameters = model_config.get('parameters', {})
+        self.stream = bool(model_config.get('stream', False))
+        self.metrics = get_metrics_collector()
+        # JSON 解析和数据校验的执行方式
+        self.offloader = get_offloader(**(model_config.get('offload') or {}))
+        self._labels = {
+            "model": self.model_name,
+            "endpoint": TransportRegistry.endpoint_key(base_url),
+            "skill": "generation"
+        }
+        cache_config = model_config.get('cache')
+        self.cache = ResponseCache(**cache_config) if cache_config else None
+        # 同一端点的运行时和模型共享限流额度
+        rate_limit = model_config.get('rate_limit') or {}
+        self.rate_limiter = get_rate_limiter(
+            f"{base_url}|{self.model_name}",
+            rate_limit.get('requests_per_minute'),
+            rate_limit.get('tokens_per_minute')
+        )
+        # 同一端点的运行时和模型共享自适应并发上限
+        concurrency = model_config.get('concurrency')
+        self.concurrency_limiter = get_concurrency_limiter(
+            f"{base_url}|{self.model_name}", **AdaptiveConcurrencyConfig(**concurrency).dict(),
+            metrics=self.metrics,
+            labels={"model": self.model_name, "endpoint": self._labels["endpoint"]}
+        ) if concurrency else None
     
+    @property
+    def client(self) -> AsyncOpenAI:
+        """获取客户端，共享连接池被关闭后会绑定到新的连接池"""
+        http_client = get_transport_registry().get_client(self.base_url, self.transport)
+        if self._client is None or self._http_client is not http_client:
+            self._http_client = http_client
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=http_client,
+                # SDK 不重试，429 直接交给 _request 的重试装饰器和限流器处理
+                max_retries=0
+            )
+        return self._client
+
+    def _concurrency_slot(self) -> Any:
+        """获取并发名额，未配置自适应并发时不限制"""
+        if self.concurrency_limiter is None:
+            return nullcontext()
+        return self.concurrency_limiter.slot()
+
+    def _cache_key(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """获取缓存键，请求不可缓存时返回 None"""
+        if self.cache and self.cache.is_cacheable(self.parameters):
+            return ResponseCache.make_key(self.model_name, messages, self.parameters)
+        return None
+
+    async def _request(self, messages: List[Dict[str, Any]]) -> str:
+        """先占用并发名额再限流，然后发送请求（与 OpenAIRuntime 的顺序一致）"""
+        estimated_tokens = estimate_message_tokens(
+            messages, self.parameters.get('max_tokens')
+        )
+        start = time.perf_counter()
+        try:
+            async with self._concurrency_slot() as slot:
+                with trace_span("llm.rate_limit", tokens=estimated_tokens):
+                    await self.rate_limiter.acquire(estimated_tokens)
+                # 请求耗时和自适应并发的延迟都不计限流等待
+                if slot is not None:
+                    slot.reset()
+                start = time.perf_counter()
+                with trace_span("llm.http", model=self.model_name), self.metrics.track_inflight(
+                    "llm_requests_in_flight", model=self.model_name, endpoint=self._labels["endpoint"]
+                ):
+                    response = await self._create(messages)
+        except Exception as e:
+            self.metrics.inc("llm_requests_total", status="error", **self._labels)
+            retry_after = get_retry_after(e)
+            if retry_after:
+                self.rate_limiter.pause(retry_after)
+            raise
+        finally:
+            self.metrics.observe(
+                "llm_request_duration_seconds", time.perf_counter() - start, **self._labels
+            )
+
+        self.metrics.inc("llm_requests_total", status="ok", **self._labels)
+        self.metrics.record_usage(response.usage, **self._labels)
+        if response.usage is not None:
+            self.rate_limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+        return response.choices[0].message.content.strip()
+
+    async def _create(self, messages: List[Dict[str, Any]]) -> Any:
+        """发送一次非流式请求"""
+        return await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            **self.parameters
+        )
+
+    @staticmethod
+    def _build_messages(prompt: str) -> List[Dict[str, Any]]:
+        return [{
+            "role": "system",
+            "content": "你是一个数据生成助手。请生成JSON格式的数据，确保每条数据都符合schema定义。"
+                       "生成的数据应该多样化，并且符合实际场景。请直接返回JSON数组，不要包含其他解释文字。"
+        }, {
+            "role": "user",
+            "content": prompt
+        }]
+
     @retry_with_exponential_backoff()
     async def _generate(self, prompt: str) -> List[Dict[str, Any]]:
+        messages = self._build_messages(prompt)
         try:
-            # 使用同步方法
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{
-                    "role": "system",
-                    "content": "你是一个数据生成助手。请生成JSON格式的数据，确保每条数据都符合schema定义。"
-                               "生成的数据应该多样化，并且符合实际场景。请直接返回JSON数组，不要包含其他解释文字。"
-                }, {
-                    "role": "user",
-                    "content": prompt
-                }],
-                **self.parameters
-            )
-            content = response.choices[0].message.content.strip()
+            cache_key = self._cache_key(messages)
+            content = self.cache.get(cache_key) if cache_key else None
+            from_cache = content is not None
+            if from_cache:
+                self.metrics.inc("llm_cache_hits_total", model=self.model_name, skill="generation")
+            else:
+                content = await self._request(messages)
             
-            try:
-                data = json.loads(content)
-                if isinstance(data, dict):
-                    return [data]
-                elif isinstance(data, list):
-                    return data
-                else:
-                    raise ValueError("返回的数据格式不正确")
-            except json.JSONDecodeError:
-                raise ValueError("返回的不是有效的JSON格式")
+            with trace_span("model.parse_json", chars=len(content), mode=self.offloader.mode):
+                data, partial = await self.offloader.run(parse_json_response, content)
+            if partial:
+                print(f"返回的JSON不完整，已保留 {len(data)} 条可解析的数据")
+
+            # 只缓存解析成功的响应
+            if cache_key and not from_cache:
+                self.cache.set(cache_key, content)
+            return data
                 
         except Exception as e:
             print(f"生成数据时发生错误: {str(e)}")
             raise e
 
+    @retry_with_exponential_backoff()
+    async def _open_stream(self, messages: List[Dict[str, Any]]) -> Tuple[Any, AsyncExitStack]:
+        """占用并发名额并限流后打开流式响应
+
+        返回响应和占用的并发名额，名额在流读取完或关闭后由调用方释放，
+        自适应并发按整个流的耗时调整上限。
+        """
+        slot_stack = AsyncExitStack()
+        slot = await slot_stack.enter_async_context(self._concurrency_slot())
+        try:
+            await self.rate_limiter.acquire(
+                estimate_message_tokens(messages, self.parameters.get('max_tokens'))
+            )
+            if slot is not None:
+                slot.reset()
+            with trace_span("llm.http", model=self.model_name, stream=True):
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    stream=True,
+                    **self.parameters
+                )
+        except BaseException as e:
+            # 把异常交给并发限制器分类后释放名额
+            await slot_stack.__aexit__(type(e), e, e.__traceback__)
+            if isinstance(e, Exception):
+                self.metrics.inc("llm_requests_total", status="error", **self._labels)
+                retry_after = get_retry_after(e)
+                if retry_after:
+                    self.rate_limiter.pause(retry_after)
+            raise
+        return response, slot_stack
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """流式生成，数组中每个对象闭合后立即返回
+
+        调用方提前停止迭代时会关闭连接，不再消耗后续 token。
+        """
+        if not self.stream:
+            for item in await self.generate(prompt):
+                yield item
+            return
+
+        messages = self._build_messages(prompt)
+        cache_key = self._cache_key(messages)
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            self.metrics.inc("llm_cache_hits_total", model=self.model_name, skill="generation")
+            for item in parse_json_items(cached):
+                yield item
+            return
+
+        parser = JSONArrayStreamParser()
+        chunks: List[str] = []
+        completed = False
+        start = time.perf_counter()
+        response, slot_stack = await self._open_stream(messages)
+        inflight_labels = {"model": self.model_name, "endpoint": self._labels["endpoint"]}
+        self.metrics.add_gauge("llm_requests_in_flight", 1, **inflight_labels)
+        error: Optional[Exception] = None
+        try:
+            async for chunk in response:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                text = chunk.choices[0].delta.content
+                chunks.append(text)
+                for item in parser.feed(text):
+                    yield item
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            try:
+                await response.close()
+            finally:
+                # 读取出错时由并发限制器对异常分类，正常结束或提前停止按成功释放名额
+                if error is not None:
+                    await slot_stack.__aexit__(type(error), error, error.__traceback__)
+                else:
+                    await slot_stack.aclose()
+            self.metrics.add_gauge("llm_requests_in_flight", -1, **inflight_labels)
+            # 流式请求的耗时包含接收完整输出（或提前停止）的时间
+            self.metrics.observe(
+                "llm_stream_duration_seconds", time.perf_counter() - start, **self._labels
+            )
+            self.metrics.inc(
+                "llm_requests_total", status="ok" if completed else "stopped", **self._labels
+            )
+
+        if parser.errors or parser.truncated:
+            print(f"流式输出中有 {parser.errors} 个对象格式错误"
+                  f"{'，输出被截断' if parser.truncated else ''}")
+        # 只缓存完整接收的响应
+        if cache_key and completed:
+            self.cache.set(cache_key, ''.join(chunks))
+
     async def generate(self, prompt: str) -> List[Dict[str, Any]]:
-        return await self._generate(prompt)
+        with trace_span("model.generate", model=self.model_name):
+            return await self._generate(prompt)
     
     def validate_config(self) -> bool:
         return bool(self.client and self.model_name)
@@ -0,0 +1,19 @@
+from typing import Any
+from src.utils.registry import LazyRegistry
+
+# 运行时类型 -> 实现类，首次使用时才导入
+RUNTIME_REGISTRY = LazyRegistry('运行时', entry_point_group='databuilder.runtimes')
+RUNTIME_REGISTRY.register('openai', 'src.runtimes.openai:OpenAIRuntime')
+
+
+def register_runtime_type(name: str, target: Any) -> None:
+    """注册运行时类型，target 可以是 "模块路径:类名" 或运行时类"""
+    RUNTIME_REGISTRY.register(name, target)
+
+
+def create_runtime(runtime_type: str, **kwargs):
+    """根据类型创建运行时"""
+    return RUNTIME_REGISTRY.get(runtime_type)(**kwargs)
+
+
+__all__ = ['RUNTIME_REGISTRY', 'register_runtime_type', 'create_runtime']
@@ -1,7 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator
+from collections import deque
+import asyncio
 import pandas as pd
 from src.skills.base import BaseSkill
+from src.utils.chunks import ChunkSource, iter_chunks
+from src.utils.sink import JSONLDatasetWriter
+
+# 单行处理失败时的输出，断点续跑不记录这些行，重新运行时会重试
+ERROR_OUTPUT = "错误"
 
 
 class BaseRuntime(ABC):
@@ -13,3 +20,71 @@ class BaseRuntime(ABC):
     ) -> pd.DataFrame:
         """运行技能"""
         pass
+
+    async def run_chunked(
+        self,
+        skill: BaseSkill,
+        source: ChunkSource,
+        chunk_size: int = 10000,
+        max_pending_chunks: int = 2,
+        skip_rows: int = 0
+    ) -> AsyncIterator[pd.DataFrame]:
+        """分块运行技能，按输入顺序逐块返回结果
+
+        同时最多有 max_pending_chunks 块在处理（前一块的尾部请求和下一块的请求
+        可以重叠），内存占用只与 chunk_size * max_pending_chunks 有关，与总行数无关。
+        结果的索引与输入块的索引一致（文件和 Arrow 输入为全局行号）。
+        Args:
+            skill: 技能
+            source: DataFrame、DataFrame 迭代器、CSV/JSONL/Parquet 路径或 Arrow 数据
+            chunk_size: 每块的行数
+            max_pending_chunks: 同时处理的块数
+            skip_rows: 跳过开头的行数
+        """
+        if max_pending_chunks < 1:
+            raise ValueError(f"max_pending_chunks 必须大于 0: {max_pending_chunks}")
+        pending: deque = deque()
+        try:
+            for chunk in iter_chunks(source, chunk_size, skip_rows=skip_rows):
+                pending.append(asyncio.ensure_future(self.run(skill, chunk)))
+                if len(pending) >= max_pending_chunks:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # 调用方提前停止迭代时取消未完成的块
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def write_chunked(
+        self,
+        skill: BaseSkill,
+        source: ChunkSource,
+        output_path: str,
+        chunk_size: int = 10000,
+        max_pending_chunks: int = 2,
+        resume: bool = False
+    ) -> int:
+        """分块运行技能，每块结果立即追加写入 JSONL 文件
+
+        每行结果包含 row_id（输入的索引或全局行号）和技能输出列；
+        resume=True 时跳过文件中已提交的行数继续处理。
+        Returns:
+            int: 文件中已写入的总行数
+        """
+        writer = JSONLDatasetWriter(output_path, resume=resume)
+        if writer.count:
+            print(f"从已写入的 {writer.count} 行继续处理")
+        completed = False
+        try:
+            async for predictions in self.run_chunked(
+                skill, source, chunk_size, max_pending_chunks, skip_rows=writer.count
+            ):
+                records = predictions.reset_index(names='row_id').to_dict(orient='records')
+                writer.write_batch(records)
+            completed = True
+        finally:
+            writer.close(complete=completed)
+        return writer.count
@@ -1,8 +1,28 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+import asyncio
+import time
 import pandas as pd
-from openai import OpenAI
-from .base import BaseRuntime
+from openai import AsyncOpenAI
+from .base import BaseRuntime, ERROR_OUTPUT
 from src.skills.base import BaseSkill
+from src.core.config import TransportConfig, AdaptiveConcurrencyConfig, HedgingConfig
+from src.core.runtime import get_transport_registry, TransportRegistry
+from src.utils.metrics import MetricsCollector, get_metrics_collector
+from src.utils.tracing import trace_span
+from src.utils.cache import ResponseCache
+from src.utils.rate_limit import get_rate_limiter
+from src.utils.concurrency import FixedConcurrencyLimiter, classify_error, get_concurrency_limiter
+from src.utils.hedging import HedgingPolicy
+from src.utils.retry import retry_with_exponential_backoff, get_retry_after
+from src.utils.tokens import estimate_message_tokens
+
+
+def _slot_outcome(task: asyncio.Task) -> Optional[str]:
+    """按任务结果得到释放并发名额时的 outcome"""
+    if task.cancelled():
+        return None
+    error = task.exception()
+    return 'ok' if error is None else classify_error(error)
 
 
 class OpenAIRuntime(BaseRuntime):
@@ -12,63 +32,285 @@ class OpenAIRuntime(BaseRuntime):
         base_url: str,
         api_key: str,
         temperature: float = 0.7,
-        timeout: int = 30
+        timeout: int = 30,
+        max_concurrency: int = 8,
+        pack_size: int = 1,
+        cache: Optional[ResponseCache] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        transport: Optional[TransportConfig] = None,
+        metrics: Optional[MetricsCollector] = None,
+        adaptive_concurrency: Optional[AdaptiveConcurrencyConfig] = None,
+        hedging: Optional[HedgingConfig] = None,
+        dedup_inputs: Optional[bool] = None,
+        input_normalizer: Optional[Callable[[str], str]] = None
     ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency 必须大于 0: {max_concurrency}")
         self.model = model
         self.temperature = temperature
         self.timeout = timeout
-        self.client = OpenAI(
-            base_url=base_url,
-            api_key=api_key,
-            timeout=timeout
+        self.max_concurrency = max_concurrency
+        self.pack_size = pack_size
+        self.cache = cache
+        # 同一端点的运行时和模型共享限流额度
+        self.rate_limiter = get_rate_limiter(
+            f"{base_url}|{model}", requests_per_minute, tokens_per_minute
         )
+        self.base_url = base_url
+        self.api_key = api_key
+        # 同一端点的运行时和模型共享连接池
+        self.transport = transport
+        self._client: Optional[AsyncOpenAI] = None
+        self._http_client = None
+        self.metrics = metrics or get_metrics_collector()
+        self._endpoint = TransportRegistry.endpoint_key(base_url)
+        # 默认同一运行时的所有请求共享固定的并发上限；
+        # 设置 adaptive_concurrency 后改为同一端点共享的自适应上限，max_concurrency 不再生效
+        if adaptive_concurrency is not None:
+            self.concurrency_limiter = get_concurrency_limiter(
+                f"{base_url}|{model}", **adaptive_concurrency.dict(),
+                metrics=self.metrics, labels={"model": model, "endpoint": self._endpoint}
+            )
+        else:
+            self.concurrency_limiter = FixedConcurrencyLimiter(max_concurrency)
+        # 渲染后输入相同的行只请求一次，input_normalizer 用于在比较前规范化输入，
+        # 例如 src.utils.helpers.normalize_whitespace。
+        # 默认（None）只在结果确定（temperature <= 0，与响应缓存的规则相同）时去重，
+        # 采样输出时每行应得到独立的结果；True / False 强制开启或关闭
+        self.dedup_inputs = dedup_inputs
+        self.input_normalizer = input_normalizer
+        # 最近一次 run 的总行数和去重后的请求行数
+        self.last_run_stats: Dict[str, int] = {}
+        # 设置后对耗时超过延迟分位数的请求发出对冲请求，
+        # 对冲请求另外占用并发名额和限流额度，没有空闲额度时不发出，额外负载由 max_extra_ratio 限制
+        self.hedging = HedgingPolicy(
+            **hedging.dict(), metrics=self.metrics, labels={"model": model, "endpoint": self._endpoint}
+        ) if hedging is not None else None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """获取客户端，共享连接池被关闭后会绑定到新的连接池"""
+        http_client = get_transport_registry().get_client(self.base_url, self.transport)
+        if self._client is None or self._http_client is not http_client:
+            self._http_client = http_client
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                timeout=self.timeout,
+                http_client=http_client,
+                # 重试只由 retry_with_exponential_backoff 负责，限流和并发控制才能看到每次 429
+                max_retries=0
+            )
+        return self._client
+
+    async def _complete(self, messages: List[Dict[str, str]], skill_name: Optional[str] = None) -> str:
+        """在并发上限内发送一次对话请求，确定性请求优先读取缓存"""
+        parameters = {"temperature": self.temperature}
+        key = None
+        if self.cache and self.cache.is_cacheable(parameters):
+            key = ResponseCache.make_key(self.model, messages, parameters)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.inc("llm_cache_hits_total", model=self.model, skill=skill_name)
+                return cached
+
+        content = await self._request(messages, skill_name)
+        if key is not None and content is not None:
+            self.cache.set(key, content)
+        return content
+
+    @retry_with_exponential_backoff()
+    async def _request(self, messages: List[Dict[str, str]], skill_name: Optional[str] = None) -> str:
+        """限流后发送请求，可重试的错误由装饰器负责重试"""
+        estimated_tokens = estimate_message_tokens(messages)
+        labels = {"model": self.model, "endpoint": self._endpoint, "skill": skill_name}
+        with trace_span("llm.request", model=self.model, skill=skill_name) as span:
+            queued = time.perf_counter()
+            async with self.concurrency_limiter.slot() as slot:
+                # 等待并发名额的时间
+                span.set_attribute("queue_ms", (time.perf_counter() - queued) * 1000)
+                with trace_span("llm.rate_limit", tokens=estimated_tokens):
+                    await self.rate_limiter.acquire(estimated_tokens)
+                # 自适应并发只按请求本身的延迟调整，不计限流等待
+                slot.reset()
+                start = time.perf_counter()
+                try:
+                    with trace_span("llm.http"), self.metrics.track_inflight(
+                        "llm_requests_in_flight", model=self.model, endpoint=self._endpoint
+                    ):
+                        response = await self._create(messages)
+                except Exception as e:
+                    self.metrics.inc("llm_requests_total", status="error", **labels)
+                    retry_after = get_retry_after(e)
+                    if retry_after:
+                        self.rate_limiter.pause(retry_after)
+                    raise
+                finally:
+                    self.metrics.observe(
+                        "llm_request_duration_seconds", time.perf_counter() - start, **labels
+                    )
+
+        self.metrics.inc("llm_requests_total", status="ok", **labels)
+        self.metrics.record_usage(response.usage, **labels)
+        if response.usage is not None:
+            self.rate_limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+        return response.choices[0].message.content
+
+    async def _create(self, messages: List[Dict[str, str]]) -> Any:
+        """发送请求，启用对冲时只对 HTTP 请求本身计时，不含排队和限流等待"""
+        def create():
+            return self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                timeout=self.timeout
+            )
+        if self.hedging is None:
+            return await create()
+        return await self.hedging.run(create, lambda: self._start_hedge(create, messages))
+
+    def _start_hedge(
+        self,
+        create: Callable[[], Awaitable[Any]],
+        messages: List[Dict[str, str]]
+    ) -> Optional[asyncio.Task]:
+        """为对冲请求占用一个并发名额和限流额度，没有空闲额度时返回 None（不对冲）"""
+        slot = self.concurrency_limiter.try_acquire()
+        if slot is None:
+            return None
+        if not self.rate_limiter.try_acquire(estimate_message_tokens(messages)):
+            self.concurrency_limiter.release(slot, None)
+            return None
+
+        async def tracked() -> Any:
+            with self.metrics.track_inflight("llm_requests_in_flight", model=self.model, endpoint=self._endpoint):
+                return await create()
+
+        task = asyncio.ensure_future(tracked())
+        # 在完成回调中释放名额，任务在开始执行前被取消也能释放
+        task.add_done_callback(lambda done: self.concurrency_limiter.release(slot, _slot_outcome(done)))
+        return task
+
+    async def _run_row(self, skill: BaseSkill, row: Dict[str, Any]) -> str:
+        """处理单行数据，错误只影响当前行"""
+        try:
+            # 构建输入
+            input_text = skill.input_template.format(**row)
+            return await self._complete([
+                {"role": "system", "content": skill.instructions},
+                {"role": "user", "content": input_text}
+            ], skill.name)
+        except Exception as e:
+            print(f"API 调用出错: {str(e)}")
+            return ERROR_OUTPUT
+
+    async def _run_pack(self, skill: BaseSkill, rows: List[Dict[str, Any]]) -> List[str]:
+        """把多行合并到一次请求中，缺失或无法解析的行回退为单行请求"""
+        outputs: Dict[int, str] = {}
+        try:
+            text = await self._complete([
+                {"role": "system", "content": skill.format_packed_instructions(len(rows))},
+                {"role": "user", "content": skill.format_packed_input(rows)}
+            ], skill.name)
+            with trace_span("runtime.parse_packed", rows=len(rows)):
+                outputs = skill.parse_packed_output(text, len(rows))
+        except Exception as e:
+            print(f"API 调用出错: {str(e)}")
+
+        missing = [i for i in range(len(rows)) if i not in outputs]
+        if missing:
+            fallback = await asyncio.gather(
+                *(self._run_row(skill, rows[i]) for i in missing)
+            )
+            outputs.update(zip(missing, fallback))
+        return [outputs[i] for i in range(len(rows))]
 
     async def run(
         self,
         skill: BaseSkill,
         data: pd.DataFrame
     ) -> pd.DataFrame:
-        """运行技能"""
-        results = []
-        for _, row in data.iterrows():
-            # 构建输入
-            input_text = skill.input_template.format(**row.to_dict())
-            
-            try:
-                # 调用 OpenAI API
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": skill.instructions},
-                        {"role": "user", "content": input_text}
-                    ],
-                    temperature=self.temperature,
-                    timeout=self.timeout
+        """运行技能
+
+        所有行并发执行（受并发上限限制），结果按原始行顺序返回，
+        索引与输入 data 保持一致。启用输入去重时渲染后输入相同的行
+        只请求一次，结果复制给所有相同的行。pack_size > 1 且技能支持时，
+        每 pack_size 行合并为一次请求。
+        """
+        with trace_span("runtime.run", skill=skill.name, rows=len(data)) as span:
+            rows = data.to_dict(orient='records')
+            unique_rows, inverse = self._dedup_rows(skill, rows)
+            span.set_attribute("unique_rows", len(unique_rows))
+
+            if self.pack_size > 1 and skill.supports_packing:
+                packs = await asyncio.gather(*(
+                    self._run_pack(skill, unique_rows[start:start + self.pack_size])
+                    for start in range(0, len(unique_rows), self.pack_size)
+                ))
+                unique_results = [output for pack in packs for output in pack]
+            else:
+                unique_results = await asyncio.gather(
+                    *(self._run_row(skill, row) for row in unique_rows)
                 )
-                
-                # 解析输出
-                output = response.choices[0].message.content
-                results.append(output)
-                
-            except Exception as e:
-                print(f"API 调用出错: {str(e)}")
-                results.append("错误")
-                
-        # 构建结果 DataFrame
-        predictions = pd.DataFrame(results, columns=[skill.name])
-        return predictions
+            results = [unique_results[i] for i in inverse] if inverse is not None else unique_results
+
+            self.last_run_stats = {"rows": len(rows), "unique_rows": len(unique_rows)}
+            self.metrics.inc("runtime_rows_total", len(rows), model=self.model, skill=skill.name)
+            self.metrics.inc(
+                "runtime_unique_rows_total", len(unique_rows), model=self.model, skill=skill.name
+            )
+            # 构建结果 DataFrame
+            predictions = pd.DataFrame(
+                {skill.name: list(results)},
+                index=data.index
+            )
+            return predictions
+
+    def should_dedup_inputs(self) -> bool:
+        """是否对输入去重，未指定时只在结果确定（temperature <= 0）时去重"""
+        if self.dedup_inputs is not None:
+            return self.dedup_inputs
+        return (self.temperature or 0) <= 0
+
+    def _dedup_rows(
+        self,
+        skill: BaseSkill,
+        rows: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Optional[List[int]]]:
+        """按渲染后的输入对行去重
+        Returns:
+            Tuple: (去重后的行, 每行对应的去重后位置)，未去重时位置为 None
+        """
+        if not self.should_dedup_inputs():
+            return rows, None
+        positions: Dict[str, int] = {}
+        unique_rows: List[Dict[str, Any]] = []
+        inverse: List[int] = []
+        for row in rows:
+            try:
+                key = skill.input_template.format(**row)
+                if self.input_normalizer is not None:
+                    key = self.input_normalizer(key)
+            except Exception:
+                # 渲染或规范化失败的行不参与去重，渲染错误由 _run_row 记录
+                key = None
+            position = positions.get(key) if key is not None else None
+            if position is None:
+                position = len(unique_rows)
+                unique_rows.append(row)
+                if key is not None:
+                    positions[key] = position
+            inverse.append(position)
+        return unique_rows, inverse
 
     async def run_raw(self, prompt: str) -> str:
         """直接运行原始提示词"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            with trace_span("runtime.run_raw"):
+                return await self._complete([
                     {"role": "user", "content": prompt}
-                ],
-                temperature=self.temperature
-            )
-            return response.choices[0].message.content
+                ], "raw")
         except Exception as e:
             print(f"API 调用出错: {str(e)}")
             return ""
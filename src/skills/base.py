@@ -5,6 +5,9 @@ import pandas as pd
 
 
 class BaseSkill(ABC):
+    # 是否支持把多行输入合并到一次请求中
+    supports_packing = False
+
     def __init__(
         self,
         name: str,
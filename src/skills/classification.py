@@ -1,16 +1,24 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+import re
 import pandas as pd
 from .base import BaseSkill
+from .labels import LabelMatcher
+
+
+_PACKED_LINE_PATTERN = re.compile(r'^\s*\[(\d+)\]\s*(.*?)\s*$')
 
 
 class ClassificationSkill(BaseSkill):
+    supports_packing = True
+
     def __init__(
         self,
         name: str,
         instructions: str,
         labels: Dict[str, List[str]],
         input_template: str,
-        output_template: str
+        output_template: str,
+        label_aliases: Optional[Dict[str, str]] = None
     ):
         super().__init__(
             name=name,
@@ -19,12 +27,64 @@ class ClassificationSkill(BaseSkill):
             output_template=output_template,
             labels=labels
         )
+        # 别名 -> 标准标签，规范化预测结果时使用
+        self.label_aliases = label_aliases or {}
+        self._label_matcher: Optional[LabelMatcher] = None
+        self._label_matcher_key = None
+
+    @property
+    def label_matcher(self) -> LabelMatcher:
+        """编译后的标签匹配器，标签、输出模板或别名变化后重新编译"""
+        key = (
+            tuple(list(self.labels.values())[0]),
+            self.output_template,
+            tuple(self.label_aliases.items())
+        )
+        if self._label_matcher is None or self._label_matcher_key != key:
+            self._label_matcher = LabelMatcher.from_skill(self, self.label_aliases)
+            self._label_matcher_key = key
+        return self._label_matcher
         
     async def apply(self, data: pd.DataFrame) -> pd.DataFrame:
         """应用分类技能"""
         # 在运行时中实现具体的分类逻辑
         return data
 
+    def format_packed_instructions(self, count: int) -> str:
+        """构建多行合并请求的系统提示词"""
+        return (
+            f"{self.instructions}\n\n"
+            f"以下共有 {count} 条输入，每条以 [序号] 开头。请逐条处理，"
+            f"每条输出单独一行，格式为：[序号] {self.output_template}\n"
+            f"必须输出全部 {count} 条，不要输出其他内容。"
+        )
+
+    def format_packed_input(self, rows: List[Dict[str, Any]]) -> str:
+        """把多行输入渲染为带序号的一条用户消息"""
+        return "\n".join(
+            f"[{i}] {self.input_template.format(**row)}"
+            for i, row in enumerate(rows, 1)
+        )
+
+    @staticmethod
+    def parse_packed_output(text: str, count: int) -> Dict[int, str]:
+        """解析带序号的输出
+        Args:
+            text: 模型输出
+            count: 输入条数
+        Returns:
+            Dict: 序号(从0开始) -> 该条输出，缺失或无法解析的序号不在结果中
+        """
+        outputs = {}
+        for line in (text or '').splitlines():
+            match = _PACKED_LINE_PATTERN.match(line)
+            if not match or not match.group(2):
+                continue
+            index = int(match.group(1)) - 1
+            if 0 <= index < count and index not in outputs:
+                outputs[index] = match.group(2)
+        return outputs
+
     @staticmethod
     def evaluate_predictions(predictions: pd.Series, ground_truth: pd.Series) -> float:
         """评估预测结果
@@ -34,13 +94,10 @@ class ClassificationSkill(BaseSkill):
         Returns:
             float: 准确率
         """
-        # 从预测结果中提取标签
-        pred_labels = predictions.apply(
-            lambda x: x.split(':')[-1].strip()
-            if ':' in str(x) else str(x).strip()
-        )
-        # 计算准确率
-        return (pred_labels == ground_truth).mean()
+        # 以真实标签编译匹配器，按标签编码比较
+        matcher = LabelMatcher(ground_truth.dropna().astype(str).unique())
+        pred_codes = matcher.codes(predictions)
+        return float(((pred_codes == matcher.codes(ground_truth)) & (pred_codes >= 0)).mean())
 
     def process_predictions(self, predictions: pd.DataFrame) -> pd.DataFrame:
         """处理预测结果格式
@@ -50,8 +107,5 @@ class ClassificationSkill(BaseSkill):
             pd.DataFrame: 处理后的预测结果
         """
         output_col = list(self.labels.keys())[0]
-        predictions[output_col] = predictions[output_col].apply(
-            lambda x: x.split(':')[-1].strip()
-            if ':' in str(x) else str(x).strip()
-        )
+        predictions[output_col] = self.label_matcher.normalize(predictions[output_col])
         return predictions
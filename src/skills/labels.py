@@ -0,0 +1,113 @@
+"""
+把模型输出的分类结果规范化为标签。
+
+LabelMatcher 由标签列表和输出模板编译一次，之后整列处理预测结果：
+1. 去掉输出模板的前缀（如 "情感分类: "），没有前缀时取最后一个冒号之后的内容
+2. 忽略大小写、全角半角、空白和标点的差异，别名映射到标准标签
+3. 返回标准标签或标签编码（无法识别为 -1）
+
+模型输出通常只有少量不同的取值，因此先用 pd.factorize 去重，只规范化去重后的值，
+再用 NumPy 按编码取回整列结果，百万行预测只需要几十毫秒。
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+_COLON_PATTERN = re.compile(r'[:：]')
+
+
+def normalize_label_text(text: str) -> str:
+    """去掉空白和标点并统一大小写、全角半角，用于比较标签"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ''.join(
+        char for char in text
+        if not unicodedata.category(char).startswith(('P', 'Z', 'C'))
+    )
+
+
+class LabelMatcher:
+    def __init__(
+        self,
+        labels: Iterable[str],
+        output_template: str = '',
+        aliases: Optional[Dict[str, str]] = None
+    ):
+        """
+        Args:
+            labels: 标准标签
+            output_template: 输出模板，第一个 { 之前的部分作为前缀
+            aliases: 别名 -> 标准标签
+        """
+        self.labels: List[str] = list(dict.fromkeys(str(label) for label in labels))
+        self.prefix = output_template.split('{')[0].strip()
+        self.categories = pd.CategoricalDtype(self.labels)
+        # 规范化文本 -> 标签编码
+        self._lookup: Dict[str, int] = {}
+        for code, label in enumerate(self.labels):
+            self._lookup.setdefault(normalize_label_text(label), code)
+        for alias, label in (aliases or {}).items():
+            if label not in self.labels:
+                raise ValueError(f"别名 {alias} 对应的标签不存在: {label}")
+            self._lookup[normalize_label_text(alias)] = self.labels.index(label)
+
+    @classmethod
+    def from_skill(cls, skill: Any, aliases: Optional[Dict[str, str]] = None) -> 'LabelMatcher':
+        """使用技能第一个标签字段的标签和输出模板编译"""
+        labels = list(skill.labels.values())[0]
+        return cls(labels, skill.output_template, aliases)
+
+    def strip_prefix(self, text: str) -> str:
+        """去掉输出模板前缀，没有前缀时取最后一个冒号之后的内容"""
+        text = text.strip()
+        if self.prefix and text.startswith(self.prefix):
+            return text[len(self.prefix):].strip()
+        parts = _COLON_PATTERN.split(text)
+        return parts[-1].strip()
+
+    def _match_one(self, value: Any) -> Tuple[str, int, bool]:
+        """规范化单个取值，返回 (去掉前缀的文本, 标签编码, 是否完全符合输出格式)"""
+        text = '' if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)) else str(value)
+        stripped = text.strip()
+        label_text = self.strip_prefix(stripped)
+        code = self._lookup.get(normalize_label_text(label_text), -1)
+        exact = (
+            stripped.startswith(self.prefix)
+            and stripped[len(self.prefix):].strip() in self.labels
+        )
+        return label_text, code, exact
+
+    def _match_unique(self, values: Any) -> Tuple[np.ndarray, List[Tuple[str, int, bool]]]:
+        if not isinstance(values, pd.Series):
+            values = pd.Series(list(values) if not hasattr(values, '__len__') else values)
+        # 保留原有的字符串 / Categorical 类型，factorize 不需要先转换为 object
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        return codes, [self._match_one(value) for value in uniques]
+
+    def codes(self, values: Any) -> np.ndarray:
+        """返回每个预测的标签编码，无法识别为 -1"""
+        codes, matched = self._match_unique(values)
+        table = np.fromiter((code for _, code, _ in matched), dtype=np.int64, count=len(matched))
+        return table[codes]
+
+    def normalize(self, values: Any) -> pd.Series:
+        """返回标准标签，无法识别的保留去掉前缀后的文本"""
+        codes, matched = self._match_unique(values)
+        table = np.array(
+            [self.labels[code] if code >= 0 else text for text, code, _ in matched] or [''],
+            dtype=object
+        )
+        index = values.index if isinstance(values, pd.Series) else None
+        return pd.Series(table[codes], index=index, name=getattr(values, 'name', None), dtype=object)
+
+    def to_categorical(self, values: Any) -> pd.Categorical:
+        """返回以标签为类别的 Categorical，无法识别的为缺失值"""
+        return pd.Categorical.from_codes(self.codes(values), dtype=self.categories)
+
+    def is_exact(self, values: Any) -> np.ndarray:
+        """每个预测是否完全符合 "前缀 + 标准标签" 的输出格式"""
+        codes, matched = self._match_unique(values)
+        table = np.fromiter((exact for _, _, exact in matched), dtype=bool, count=len(matched))
+        return table[codes]
@@ -1,3 +1,9 @@
-from .retry import retry_with_exponential_backoff
-
 __all__ = ['retry_with_exponential_backoff']
+
+
+def __getattr__(name):
+    # 延迟导入，避免导入 src.utils 的子模块时加载 asyncio
+    if name == 'retry_with_exponential_backoff':
+        from .retry import retry_with_exponential_backoff
+        return retry_with_exponential_backoff
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,218 @@
+"""
+LLM 响应的本地磁盘缓存。
+
+以 (model, messages, parameters) 的规范化哈希作为键，把模型返回的原始文本
+保存在本地 SQLite 文件中：
+1. 支持按条目数、总字节数限制容量，超出时按最近访问时间（LRU）淘汰
+2. 支持 TTL，读取到的过期条目立即删除，其余过期条目由写入时的定期清理删除
+3. 默认只缓存确定性请求（temperature 为 0 或未设置），
+   设置 include_nondeterministic=True 后也缓存 temperature > 0 的请求
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+
+class ResponseCache:
+    # 两次清理过期条目之间的最短间隔（秒）
+    EXPIRE_INTERVAL_SECONDS = 60.0
+    # 缓存命中的访问时间先记在内存中，累积到该数量或写入时再批量更新
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(
+        self,
+        path: str = '.cache/llm_responses.sqlite',
+        max_entries: Optional[int] = None,
+        max_size_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        include_nondeterministic: bool = False
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_size_bytes = max_size_bytes
+        self.ttl_seconds = ttl_seconds
+        self.include_nondeterministic = include_nondeterministic
+        self.hits = 0
+        self.misses = 0
+        self._pending_access: Dict[str, float] = {}
+        self._next_expire = 0.0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access"
+            " ON responses (last_access)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_created_at"
+            " ON responses (created_at)"
+        )
+        self._conn.commit()
+        # 容量统计保存在内存中，避免每次写入都全表扫描
+        self._entries, self._size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """生成请求的规范化哈希键"""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "parameters": parameters or {}},
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(',', ':'),
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, parameters: Optional[Dict[str, Any]] = None) -> bool:
+        """判断请求是否允许缓存"""
+        if self.include_nondeterministic:
+            return True
+        temperature = (parameters or {}).get('temperature') or 0
+        return temperature <= 0
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, size, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._pending_access.pop(key, None)
+                self._entries -= 1
+                self._size -= size
+                self.misses += 1
+                return None
+
+            self._pending_access[key] = now
+            if len(self._pending_access) >= self.ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return value
+
+    def _flush_access(self) -> None:
+        """把内存中的访问时间写入数据库（调用方需持有锁并提交）"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(access, key) for key, access in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, value, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            if old is None:
+                self._entries += 1
+            else:
+                self._size -= old[0]
+            self._size += size
+            self._pending_access.pop(key, None)
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """淘汰过期条目和超出容量的条目（调用方需持有锁）"""
+        if self.ttl_seconds is not None and now >= self._next_expire:
+            # 按 created_at 索引只读取过期条目，不扫描全表
+            self._next_expire = now + self.EXPIRE_INTERVAL_SECONDS
+            cutoff = now - self.ttl_seconds
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?",
+                (cutoff,)
+            ).fetchone()
+            if count:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+                self._entries -= count
+                self._size -= size
+
+        if not self._over_capacity():
+            return
+        # 按最近访问时间淘汰前先写入内存中的访问时间
+        self._flush_access()
+        while self._over_capacity():
+            # 每次淘汰一小批最久未访问的条目
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if not self._over_capacity():
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._entries -= 1
+                self._size -= size
+
+    def _over_capacity(self) -> bool:
+        if self.max_entries is not None and self._entries > self.max_entries:
+            return True
+        if self.max_size_bytes is not None and self._size > self.max_size_bytes:
+            return True
+        return False
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._pending_access.clear()
+            self._entries, self._size = 0, 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "entries": self._entries,
+            "size_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
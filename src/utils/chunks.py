@@ -0,0 +1,116 @@
+"""
+把各种输入源按固定行数切分为 DataFrame 块。
+
+支持的输入：
+1. DataFrame：按行切片（不复制底层数据）
+2. DataFrame 的迭代器或列表：原样使用，保留各块自己的索引
+3. 文件路径：.csv / .tsv、.jsonl / .ndjson、.parquet 逐块读取，不会一次性载入内存；
+   .arrow / .feather 通过内存映射读取
+4. pyarrow Dataset / Table / RecordBatchReader：逐批转换为 DataFrame
+
+从文件和 Arrow 数据读取的块使用全局行号作为索引，结果可以按行号和输入对应。
+"""
+
+import os
+from typing import Any, Iterable, Iterator, Union
+import pandas as pd
+
+
+ChunkSource = Union[pd.DataFrame, str, os.PathLike, Iterable[pd.DataFrame], Any]
+
+
+def _with_row_ids(chunks: Iterable[pd.DataFrame], start: int = 0) -> Iterator[pd.DataFrame]:
+    """把各块的索引替换为连续的全局行号"""
+    offset = start
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+
+def _iter_parquet(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("读取 Parquet 文件需要安装 pyarrow: pip install pyarrow") from e
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def _iter_arrow(source: Any, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """逐批读取 pyarrow Dataset / Table / RecordBatchReader"""
+    if hasattr(source, 'scanner'):
+        # pyarrow.dataset.Dataset
+        batches = source.to_batches(batch_size=chunk_size)
+    elif hasattr(source, 'to_batches'):
+        # pyarrow.Table
+        batches = source.to_batches(max_chunksize=chunk_size)
+    else:
+        # pyarrow.RecordBatchReader
+        batches = source
+    for batch in batches:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def _is_arrow(source: Any) -> bool:
+    return type(source).__module__.startswith('pyarrow')
+
+
+def iter_chunks(source: ChunkSource, chunk_size: int = 10000, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """按 chunk_size 行切分输入
+    Args:
+        source: 输入数据，见模块说明
+        chunk_size: 每块的行数（DataFrame 迭代器按原有分块）
+        skip_rows: 跳过开头的行数，用于断点续跑
+    Returns:
+        Iterator: DataFrame 块
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size 必须大于 0: {chunk_size}")
+
+    if isinstance(source, pd.DataFrame):
+        for start in range(skip_rows, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix in ('.csv', '.tsv'):
+            chunks = pd.read_csv(
+                path, sep='\t' if suffix == '.tsv' else ',', chunksize=chunk_size,
+                skiprows=range(1, skip_rows + 1) if skip_rows else None
+            )
+        elif suffix in ('.jsonl', '.ndjson'):
+            chunks = pd.read_json(path, lines=True, chunksize=chunk_size)
+            chunks = _skip_rows(chunks, skip_rows)
+        elif suffix == '.parquet':
+            chunks = _skip_rows(_iter_parquet(path, chunk_size), skip_rows)
+        elif suffix in ('.arrow', '.feather'):
+            from .columnar import read_table
+            chunks = _skip_rows(_iter_arrow(read_table(path), chunk_size), skip_rows)
+        else:
+            raise ValueError(f"不支持的文件格式: {path}")
+        yield from _with_row_ids(chunks, start=skip_rows)
+        return
+
+    if _is_arrow(source):
+        yield from _with_row_ids(_skip_rows(_iter_arrow(source, chunk_size), skip_rows), start=skip_rows)
+        return
+
+    # DataFrame 的迭代器：保留各块自己的索引
+    yield from _skip_rows(iter(source), skip_rows)
+
+
+def _skip_rows(chunks: Iterable[pd.DataFrame], skip_rows: int) -> Iterator[pd.DataFrame]:
+    remaining = skip_rows
+    for chunk in chunks:
+        if remaining >= len(chunk):
+            remaining -= len(chunk)
+            continue
+        if remaining:
+            chunk = chunk.iloc[remaining:]
+            remaining = 0
+        yield chunk
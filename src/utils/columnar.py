@@ -0,0 +1,236 @@
+"""
+按 schema 写入和读取列式数据集（Parquet / Arrow IPC），需要安装 pyarrow。
+
+Arrow 类型由 SchemaConfig 的字段推导：
+1. string / integer / number / boolean 对应 Arrow 的基本类型，非必填字段允许为空
+2. 带 choices 的字段使用字典编码（类似 pandas 的 category），字典固定为 schema 中的
+   choices，所有 row group / record batch 共用同一个字典，读取时转换为 Categorical
+3. array / object 字段的元素类型不固定，按 JSON 文本存储，iter_records 读取时还原
+
+写入器把 write_batch 的数据缓存到 row_group_size 行后写出一个 row group
+（Arrow IPC 为一个 record batch），内存中最多保留一个 row group 的数据。
+.arrow / .feather 默认不压缩，可以通过内存映射零拷贝读取；Parquet 默认使用 zstd 压缩。
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from . import fastjson
+from .tracing import trace_span
+
+# schema 类型 -> Arrow 类型名称
+ARROW_TYPES = {
+    "string": "string",
+    "str": "string",
+    "integer": "int64",
+    "int": "int64",
+    "number": "float64",
+    "float": "float64",
+    "boolean": "bool_",
+    "bool": "bool_",
+}
+# 按 JSON 文本存储的类型
+JSON_TYPES = {"array", "list", "object", "dict"}
+# 写入 Arrow 字段元数据，标记按 JSON 文本存储的列
+JSON_METADATA = {b"databuilder.encoding": b"json"}
+
+COLUMNAR_SUFFIXES = ('.parquet', '.arrow', '.feather')
+
+# compression='auto' 时各格式使用的压缩算法
+DEFAULT_COMPRESSION = {'.parquet': 'zstd', '.arrow': None, '.feather': None}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("读写 Parquet / Arrow 文件需要安装 pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def is_columnar_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in COLUMNAR_SUFFIXES
+
+
+def arrow_schema(fields: List[Any]) -> Any:
+    """由 SchemaField 列表生成 pyarrow.Schema"""
+    pa = _import_pyarrow()
+    arrow_fields = []
+    for field in fields:
+        field_type = field.type.lower()
+        nullable = not getattr(field, 'required', True)
+        if field_type in JSON_TYPES:
+            arrow_fields.append(pa.field(field.name, pa.string(), nullable, metadata=JSON_METADATA))
+            continue
+        value_type = getattr(pa, ARROW_TYPES.get(field_type, "string"))()
+        if getattr(field, 'choices', None):
+            value_type = pa.dictionary(pa.int32(), value_type)
+        arrow_fields.append(pa.field(field.name, value_type, nullable))
+    return pa.schema(arrow_fields)
+
+
+class ColumnarDatasetWriter:
+    def __init__(
+        self,
+        output_path: str,
+        fields: List[Any],
+        compression: Optional[str] = 'auto',
+        compression_level: Optional[int] = None,
+        row_group_size: int = 10000
+    ):
+        """
+        Args:
+            output_path: .parquet 写入 Parquet，.arrow / .feather 写入 Arrow IPC 文件
+            fields: SchemaField 列表
+            compression: auto（Parquet 用 zstd，Arrow IPC 不压缩）、zstd、lz4、snappy（仅 Parquet）或 None
+            compression_level: 压缩级别，None 使用默认值
+            row_group_size: 每个 row group 的最少行数（关闭时写出剩余的行）
+        """
+        pa = _import_pyarrow()
+        if row_group_size < 1:
+            raise ValueError(f"row_group_size 必须大于 0: {row_group_size}")
+        self.path = Path(output_path)
+        suffix = self.path.suffix.lower()
+        if suffix not in COLUMNAR_SUFFIXES:
+            raise ValueError(f"不支持的列式文件格式: {output_path}")
+        if compression == 'auto':
+            compression = DEFAULT_COMPRESSION[suffix]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.schema = arrow_schema(fields)
+        self.row_group_size = row_group_size
+        # 已接收的行数（包括尚未写出的缓存）
+        self.count = 0
+        self._pa = pa
+        self._buffer: List[Dict[str, Any]] = []
+        self._json_columns = {
+            field.name for field in self.schema
+            if field.metadata and field.metadata.get(b"databuilder.encoding") == b"json"
+        }
+        # 字典编码列的固定字典：列名 -> (取值 -> 编码, 字典)
+        self._dictionaries: Dict[str, Any] = {}
+        for field in fields:
+            arrow_field = self.schema.field(field.name)
+            if pa.types.is_dictionary(arrow_field.type):
+                # choices 按字符串声明，转换为字段的类型
+                dictionary = pa.array(list(dict.fromkeys(field.choices))).cast(arrow_field.type.value_type)
+                self._dictionaries[field.name] = (
+                    {choice: code for code, choice in enumerate(dictionary.to_pylist())},
+                    dictionary
+                )
+
+        if suffix == '.parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(
+                str(self.path), self.schema,
+                compression=compression or 'none',
+                compression_level=compression_level
+            )
+        elif suffix in ('.arrow', '.feather'):
+            options = pa.ipc.IpcWriteOptions(
+                compression=pa.Codec(compression, compression_level) if compression else None
+            )
+            self._writer = pa.ipc.new_file(str(self.path), self.schema, options=options)
+
+    def _to_record_batch(self, items: List[Dict[str, Any]]) -> Any:
+        pa = self._pa
+        arrays = []
+        for field in self.schema:
+            values = [item.get(field.name) for item in items]
+            if field.name in self._json_columns:
+                values = [None if value is None else fastjson.dumps(value) for value in values]
+                arrays.append(pa.array(values, type=pa.string()))
+            elif pa.types.is_dictionary(field.type):
+                # 按 schema 的 choices 编码，Arrow IPC 文件要求各批次的字典相同
+                lookup, dictionary = self._dictionaries[field.name]
+                try:
+                    indices = [None if value is None else lookup[value] for value in values]
+                except (KeyError, TypeError) as e:
+                    raise ValueError(f"字段 {field.name} 的取值不在 choices 中: {e}") from e
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(indices, type=field.type.index_type), dictionary
+                ))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def write_batch(self, items: List[Dict[str, Any]]) -> None:
+        """追加一批数据，缓存满 row_group_size 行时写出一个 row group"""
+        if not items:
+            return
+        self._buffer.extend(items)
+        self.count += len(items)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        items, self._buffer = self._buffer, []
+        with trace_span("io.write_batch", items=len(items), format=self.path.suffix):
+            self._writer.write_batch(self._to_record_batch(items))
+
+    def close(self, complete: bool = False) -> None:
+        """写出缓存的数据，关闭文件并写出文件尾，之后文件才能被读取"""
+        if self._writer is None:
+            return
+        try:
+            self._flush()
+        finally:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> 'ColumnarDatasetWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def save_columnar_data(
+    data: List[Dict[str, Any]],
+    output_path: str,
+    fields: List[Any],
+    compression: Optional[str] = 'auto'
+) -> None:
+    """保存数据为 Parquet 或 Arrow IPC 文件"""
+    with ColumnarDatasetWriter(output_path, fields, compression=compression) as writer:
+        writer.write_batch(data)
+
+
+def read_table(path: str, columns: Optional[List[str]] = None, memory_map: bool = True) -> Any:
+    """读取列式数据集为 pyarrow.Table
+
+    Arrow IPC 文件通过内存映射读取，未压缩时不复制数据；Parquet 文件需要解码，
+    memory_map 只减少读取时的系统调用。
+    """
+    pa = _import_pyarrow()
+    with trace_span("io.read_table", path=path):
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix == '.parquet':
+            import pyarrow.parquet as pq
+            return pq.read_table(path, columns=columns, memory_map=memory_map)
+        if suffix in ('.arrow', '.feather'):
+            source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+            table = pa.ipc.open_file(source).read_all()
+            return table.select(columns) if columns else table
+        raise ValueError(f"不支持的列式文件格式: {path}")
+
+
+def read_frame(path: str, columns: Optional[List[str]] = None) -> Any:
+    """读取列式数据集为 DataFrame，字典编码的列转换为 Categorical"""
+    return read_table(path, columns=columns).to_pandas()
+
+
+def iter_records(path: str, batch_size: int = 10000) -> Iterator[Dict[str, Any]]:
+    """逐条读取数据，还原按 JSON 文本存储的 array / object 字段"""
+    table = read_table(path)
+    json_columns = [
+        field.name for field in table.schema
+        if field.metadata and field.metadata.get(b"databuilder.encoding") == b"json"
+    ]
+    for batch in table.to_batches(max_chunksize=batch_size):
+        for record in batch.to_pylist():
+            for name in json_columns:
+                if record[name] is not None:
+                    record[name] = fastjson.loads(record[name])
+            yield record
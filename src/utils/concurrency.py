@@ -0,0 +1,262 @@
+"""
+请求并发上限控制。
+
+FixedConcurrencyLimiter 使用固定上限；AdaptiveConcurrencyLimiter 按 AIMD
+（加性增、乘性减）自动调整上限：
+1. 上限被用满且请求成功、延迟没有明显升高时，每完成约 limit 个请求上限加 increase
+2. 收到限流（429）、服务过载（503）、超时，或近期延迟超过基线的 latency_tolerance 倍时，
+   上限乘以 decrease_factor
+3. 一次下调之前发出的请求再报告拥塞不会重复下调，避免同一波 429 把上限降到最低
+4. 参数错误等与负载无关的异常不影响上限
+
+近期延迟和延迟基线都是成功请求延迟的滑动平均，近期延迟变化快，单个慢请求不会触发下调；
+基线变化慢，单次样本对基线的影响被限制在 latency_tolerance 倍以内，服务整体变慢时基线会逐渐跟上。
+同一端点（base_url + 模型名）的 OpenAIModel / OpenAIRuntime 共享一个自适应限制器，
+当前上限通过 llm_concurrency_limit 指标输出。
+两种限制器都可以用 try_acquire 不等待地占用名额（对冲请求没有空闲名额时直接放弃）。
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from .metrics import MetricsCollector, get_metrics_collector
+
+# 按名称判断超时类异常，以免引入 openai / httpx 依赖
+TIMEOUT_ERROR_NAMES = {'APITimeoutError', 'ReadTimeout', 'ConnectTimeout', 'PoolTimeout', 'WriteTimeout'}
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """把异常归类为 throttled、timeout，与负载无关的异常返回 None"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or type(error).__name__ in TIMEOUT_ERROR_NAMES:
+        return 'timeout'
+    status_code = getattr(error, 'status_code', None)
+    if status_code in (429, 503):
+        return 'throttled'
+    if status_code in (408, 504):
+        return 'timeout'
+    return None
+
+
+class ConcurrencySlot:
+    """一个在途请求占用的名额，start 是计算延迟的起点"""
+
+    __slots__ = ('start',)
+
+    def __init__(self):
+        self.start = time.monotonic()
+
+    def reset(self) -> None:
+        """重新开始计时（例如在限流等待结束后）"""
+        self.start = time.monotonic()
+
+
+class FixedConcurrencyLimiter:
+    """固定上限的并发控制，先到的请求先获得名额"""
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError(f"并发上限必须大于 0: {limit}")
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # 等待者绑定到事件循环，换用新的事件循环时丢弃旧的等待者
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[ConcurrencySlot]:
+        """占用一个名额，退出时按请求结果释放"""
+        await self._acquire()
+        slot = ConcurrencySlot()
+        try:
+            yield slot
+        except asyncio.CancelledError:
+            self.release(slot, None)
+            raise
+        except Exception as e:
+            self.release(slot, classify_error(e))
+            raise
+        else:
+            self.release(slot, 'ok')
+
+    def try_acquire(self) -> Optional[ConcurrencySlot]:
+        """有空闲名额且没有等待者时立即占用，否则返回 None；占用的名额需要调用 release 释放"""
+        if self._waiters or self.in_flight >= self.current_limit:
+            return None
+        self.in_flight += 1
+        return ConcurrencySlot()
+
+    def release(self, slot: ConcurrencySlot, outcome: Optional[str]) -> None:
+        """释放名额，outcome 为 ok、classify_error 的结果，或 None（取消等与负载无关的结果）"""
+        saturated = self.in_flight >= self.current_limit
+        self.in_flight -= 1
+        self._on_release(slot, outcome, saturated)
+        self._wake()
+
+    def _on_release(self, slot: ConcurrencySlot, outcome: Optional[str], saturated: bool) -> None:
+        pass
+
+    async def _acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 换用新的事件循环时，旧事件循环上的等待者不会再被唤醒
+            self._waiters.clear()
+            self._loop = loop
+        if not self._waiters and self.in_flight < self.current_limit:
+            self.in_flight += 1
+            return
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已经分配，交还给其他等待者
+                self.in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter(FixedConcurrencyLimiter):
+    # 近期延迟的平滑系数
+    RECENT_SMOOTHING = 0.3
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_smoothing: float = 0.05,
+        warmup_requests: int = 5,
+        metrics: Optional[MetricsCollector] = None,
+        labels: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            initial_limit: 初始并发上限
+            min_limit / max_limit: 上限的调整范围
+            increase: 每轮（约 limit 个成功请求）增加的上限
+            decrease_factor: 拥塞时上限乘以的系数
+            latency_tolerance: 近期延迟超过基线的倍数视为拥塞
+            latency_smoothing: 延迟基线的平滑系数（近期延迟固定为 RECENT_SMOOTHING）
+            warmup_requests: 前几个请求只用于建立延迟基线
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(f"并发上限需满足 1 <= min_limit <= initial_limit <= max_limit: "
+                             f"{min_limit}, {initial_limit}, {max_limit}")
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"decrease_factor 必须在 0 和 1 之间: {decrease_factor}")
+        super().__init__(initial_limit)
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_smoothing = latency_smoothing
+        self.warmup_requests = warmup_requests
+        self.metrics = metrics or get_metrics_collector()
+        self.labels = labels or {}
+        self.baseline_latency: Optional[float] = None
+        self.recent_latency: Optional[float] = None
+        self._samples = 0
+        self._last_decrease = float('-inf')
+        self.metrics.set_gauge("llm_concurrency_limit", self.current_limit, **self.labels)
+
+    def configure(self, min_limit: int, max_limit: int) -> None:
+        """更新上限的调整范围，当前上限按新范围截断"""
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._set_limit(min(max(self.limit, min_limit), max_limit))
+
+    def _on_release(self, slot: ConcurrencySlot, outcome: Optional[str], saturated: bool) -> None:
+        """按请求结果调整上限"""
+        if outcome == 'ok':
+            self._on_success(slot, time.monotonic() - slot.start, saturated)
+        elif outcome is not None:
+            self._decrease(slot, outcome)
+
+    def _on_success(self, slot: ConcurrencySlot, latency: float, saturated: bool) -> None:
+        self._samples += 1
+        baseline = self.baseline_latency
+        if baseline is None:
+            self.baseline_latency = self.recent_latency = latency
+            return
+        self.baseline_latency = baseline + self.latency_smoothing * (
+            min(latency, baseline * self.latency_tolerance) - baseline
+        )
+        self.recent_latency += self.RECENT_SMOOTHING * (latency - self.recent_latency)
+        if self._samples <= self.warmup_requests:
+            return
+        if self.recent_latency > baseline * self.latency_tolerance:
+            self._decrease(slot, 'latency')
+        elif saturated and self.limit < self.max_limit:
+            # 每个成功请求加 increase / limit，约每轮加 increase
+            if self._set_limit(min(self.max_limit, self.limit + self.increase / self.limit)):
+                self.metrics.inc("llm_concurrency_adjustments_total", direction="up", reason="ok", **self.labels)
+
+    def _decrease(self, slot: ConcurrencySlot, reason: str) -> None:
+        if slot.start < self._last_decrease:
+            # 上次下调之前发出的请求，拥塞已经处理过
+            return
+        self._last_decrease = time.monotonic()
+        self._set_limit(max(self.min_limit, self.limit * self.decrease_factor))
+        self.metrics.inc("llm_concurrency_adjustments_total", direction="down", reason=reason, **self.labels)
+
+    def _set_limit(self, limit: float) -> bool:
+        """设置上限，返回整数上限是否变化"""
+        previous = self.current_limit
+        self.limit = limit
+        if self.current_limit == previous:
+            return False
+        self.metrics.set_gauge("llm_concurrency_limit", self.current_limit, **self.labels)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.current_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "baseline_latency": self.baseline_latency,
+            "recent_latency": self.recent_latency
+        }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_concurrency_limiter(
+    key: str,
+    initial_limit: int = 8,
+    min_limit: int = 1,
+    max_limit: int = 64,
+    **kwargs: Any
+) -> AdaptiveConcurrencyLimiter:
+    """获取指定端点共享的自适应并发限制器，已存在时只更新调整范围"""
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(initial_limit, min_limit, max_limit, **kwargs)
+        _limiters[key] = limiter
+    else:
+        limiter.configure(min_limit, max_limit)
+    return limiter
@@ -0,0 +1,210 @@
+"""
+生成数据的近似重复检测。
+
+对指定文本字段做规范化后：
+1. 精确去重：文本的 64 位哈希已出现过则判为完全重复
+2. 近似去重：字符 n-gram 的 MinHash 签名分成若干 band，任一 band 与已有数据
+   相同则判为近似重复（LSH），相似度阈值由 band 划分决定
+
+哈希键保存在按 band 划分的 uint64 有序数组中，每条数据只占用
+(bands + 1) * 8 字节，百万级数据也只需要几十 MB 内存；索引可以保存到磁盘，
+下次运行时加载后继续去重。
+"""
+
+import hashlib
+import os
+import re
+from typing import Dict, Any, List, Optional, Set
+import numpy as np
+
+
+_NORMALIZE_PATTERN = re.compile(r'[\s\W_]+', re.UNICODE)
+
+_SHINGLE_BASE = np.uint64(1000003)
+
+# 新增键超过该数量（或有序数组长度的 1/8）时合并到有序数组
+_COMPACT_THRESHOLD = 65536
+
+
+class _KeySet:
+    """uint64 键集合：有序 numpy 数组 + 最近新增的小集合"""
+
+    def __init__(self, keys: Optional[np.ndarray] = None):
+        self._main = np.unique(keys.astype(np.uint64)) if keys is not None else np.empty(0, dtype=np.uint64)
+        self._recent: Set[int] = set()
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        if not self._main.size:
+            return False
+        position = np.searchsorted(self._main, np.uint64(key))
+        return position < self._main.size and int(self._main[position]) == key
+
+    def __len__(self) -> int:
+        return self._main.size + len(self._recent)
+
+    def add(self, key: int) -> None:
+        self._recent.add(key)
+        if len(self._recent) > max(_COMPACT_THRESHOLD, self._main.size // 8):
+            self._compact()
+
+    def _compact(self) -> None:
+        if self._recent:
+            recent = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))
+            self._main = np.union1d(self._main, recent)
+            self._recent.clear()
+
+    def to_array(self) -> np.ndarray:
+        self._compact()
+        return self._main
+
+
+def _choose_bands(num_perm: int, threshold: float) -> int:
+    """选择 band 数，使 LSH 的相似度阈值 (1/b)^(1/r) 最接近目标阈值"""
+    best_bands, best_error = 1, float('inf')
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best_bands, best_error = bands, error
+    return best_bands
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        fields: List[str],
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        ngram: int = 3,
+        exact: bool = True,
+        seed: int = 1
+    ):
+        self.fields = list(fields)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.exact = exact
+        self.seed = seed
+        self.bands = _choose_bands(num_perm, threshold)
+        self.rows_per_band = num_perm // self.bands
+
+        rng = np.random.default_rng(seed)
+        # multiply-shift 哈希族：((a * x + b) mod 2^64) >> 32，a 取 64 位奇数
+        self._a = rng.integers(1, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+        # 把每个 band 的 r 个签名值合成一个 64 位键
+        self._band_mix = rng.integers(1, 2 ** 64, size=self.rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+        self._exact_keys = _KeySet()
+        self._band_keys = [_KeySet() for _ in range(self.bands)]
+        self.stats = {"total": 0, "unique": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def _normalize(self, item: Dict[str, Any]) -> str:
+        parts = [str(item.get(field, '')) for field in self.fields]
+        return _NORMALIZE_PATTERN.sub(' ', ' '.join(parts).lower()).strip()
+
+    @staticmethod
+    def _hash64(data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+    def _signature(self, text: str) -> np.ndarray:
+        # 按码点向量化计算字符 n-gram 的多项式哈希
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        n = min(self.ngram, codes.size) or 1
+        if not codes.size:
+            codes = np.zeros(1, dtype=np.uint64)
+        shingles = codes[:codes.size - n + 1].copy()
+        for offset in range(1, n):
+            shingles = shingles * _SHINGLE_BASE + codes[offset:codes.size - n + 1 + offset]
+        values = (self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+    def _band_hashes(self, signature: np.ndarray) -> List[int]:
+        bands = signature.astype(np.uint64).reshape(self.bands, self.rows_per_band)
+        return (bands * self._band_mix).sum(axis=1, dtype=np.uint64).tolist()
+
+    def add(self, item: Dict[str, Any]) -> bool:
+        """检查并加入索引，返回 True 表示不是重复数据"""
+        self.stats["total"] += 1
+        text = self._normalize(item)
+
+        exact_key = self._hash64(text.encode('utf-8'))
+        if self.exact and exact_key in self._exact_keys:
+            self.stats["exact_duplicates"] += 1
+            return False
+
+        band_hashes = self._band_hashes(self._signature(text))
+        if any(key in keys for key, keys in zip(band_hashes, self._band_keys)):
+            self.stats["near_duplicates"] += 1
+            return False
+
+        if self.exact:
+            self._exact_keys.add(exact_key)
+        for key, keys in zip(band_hashes, self._band_keys):
+            keys.add(key)
+        self.stats["unique"] += 1
+        return True
+
+    def filter(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤掉重复数据（包括同一批次内的重复），保留的数据会加入索引"""
+        return [item for item in items if self.add(item)]
+
+    @property
+    def duplicate_rate(self) -> float:
+        total = self.stats["total"]
+        if not total:
+            return 0.0
+        return (self.stats["exact_duplicates"] + self.stats["near_duplicates"]) / total
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "duplicate_rate": self.duplicate_rate}
+
+    def __len__(self) -> int:
+        return self.stats["unique"]
+
+    @staticmethod
+    def index_file(path: str) -> str:
+        """索引文件的实际路径，没有 .npz 后缀时添加"""
+        return path if path.endswith('.npz') else path + '.npz'
+
+    def save(self, path: str) -> None:
+        """保存索引到磁盘（numpy .npz 格式，路径没有 .npz 后缀时会自动添加）"""
+        path = self.index_file(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 先写临时文件再替换，中断时不会留下损坏的索引
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                params=np.array([self.threshold, self.num_perm, self.ngram, int(self.exact), self.seed]),
+                fields=np.array(self.fields, dtype=str),
+                stats=np.array([self.stats[k] for k in ("total", "unique", "exact_duplicates", "near_duplicates")]),
+                exact_keys=self._exact_keys.to_array(),
+                **{f"band_{i}": keys.to_array() for i, keys in enumerate(self._band_keys)}
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'NearDuplicateIndex':
+        """从磁盘加载索引"""
+        with np.load(cls.index_file(path)) as data:
+            threshold, num_perm, ngram, exact, seed = data["params"].tolist()
+            index = cls(
+                fields=data["fields"].tolist(),
+                threshold=threshold,
+                num_perm=int(num_perm),
+                ngram=int(ngram),
+                exact=bool(exact),
+                seed=int(seed)
+            )
+            index.stats = dict(zip(
+                ("total", "unique", "exact_duplicates", "near_duplicates"),
+                data["stats"].tolist()
+            ))
+            index._exact_keys = _KeySet(data["exact_keys"])
+            index._band_keys = [_KeySet(data[f"band_{i}"]) for i in range(index.bands)]
+        return index
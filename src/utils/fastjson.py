@@ -0,0 +1,40 @@
+"""
+JSON 编解码，安装了 orjson 时使用 orjson。
+
+orjson 的解析速度约为标准库的 2~5 倍，输出与 json.dumps(ensure_ascii=False,
+separators=(',', ':')) 一致。orjson 无法处理的数据（非字符串键、超出 64 位的整数等）
+回退到标准库。orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，
+调用方按标准库的异常处理即可。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def loads(data: Any) -> Any:
+    """解析 JSON 文本（str 或 bytes）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """序列化为 UTF-8 编码的紧凑 JSON，不转义非 ASCII 字符"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj: Any) -> str:
+    """序列化为紧凑 JSON 字符串，不转义非 ASCII 字符"""
+    return dumps_bytes(obj).decode('utf-8')
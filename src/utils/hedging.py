@@ -0,0 +1,128 @@
+"""
+对冲请求（hedged requests），降低尾延迟。
+
+请求耗时超过最近请求延迟的指定分位数后，再发出一个相同的请求，
+先成功返回的结果生效，另一个请求被取消：
+1. 延迟分位数按最近 window 个请求计算，样本不足 min_samples 时不对冲
+2. 对冲额度按请求数累积，每个请求增加 max_extra_ratio 次额度，
+   额外请求数不超过总请求数的 max_extra_ratio
+3. 任一请求失败时继续等待另一个，两个都失败时抛出后失败的异常
+4. 调用方可以提供 hedge 函数为对冲请求占用并发名额和限流额度，没有空闲额度时不对冲
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from .metrics import MetricsCollector, get_metrics_collector
+
+T = TypeVar('T')
+
+
+class HedgingPolicy:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_extra_ratio: float = 0.05,
+        window: int = 500,
+        min_samples: int = 20,
+        min_delay_seconds: float = 0.05,
+        metrics: Optional[MetricsCollector] = None,
+        labels: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            percentile: 超过该延迟分位数（0~100）时发出对冲请求
+            max_extra_ratio: 对冲请求占总请求数的上限
+            window: 计算分位数使用的最近请求数
+            min_samples: 开始对冲前需要的样本数
+            min_delay_seconds: 对冲等待时间的下限
+        """
+        if not 0 < percentile < 100:
+            raise ValueError(f"percentile 必须在 0 和 100 之间: {percentile}")
+        if not 0 <= max_extra_ratio <= 1:
+            raise ValueError(f"max_extra_ratio 必须在 0 和 1 之间: {max_extra_ratio}")
+        self.percentile = percentile
+        self.max_extra_ratio = max_extra_ratio
+        self.min_samples = min_samples
+        self.min_delay_seconds = min_delay_seconds
+        self.metrics = metrics or get_metrics_collector()
+        self.labels = labels or {}
+        self._latencies: Deque[float] = deque(maxlen=window)
+        # 可用的对冲额度，最多累积一个突发
+        self._credit = 0.0
+        self._max_credit = max(1.0, max_extra_ratio * min_samples)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> Optional[float]:
+        """当前的对冲等待时间，样本不足时返回 None"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay_seconds, ordered[index])
+
+    def record(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        hedge: Optional[Callable[[], Optional[Awaitable[T]]]] = None
+    ) -> T:
+        """执行 call()，超过对冲等待时间仍未返回时再发出对冲请求，返回先成功的结果
+
+        Args:
+            call: 发出原请求
+            hedge: 发出对冲请求，返回 None 表示当前没有额度、放弃对冲；默认再执行一次 call()
+        """
+        self.requests += 1
+        self._credit = min(self._max_credit, self._credit + self.max_extra_ratio)
+        delay = self.delay()
+        start = time.monotonic()
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self._credit >= 1:
+                    request = (hedge or call)()
+                    if request is None:
+                        self.metrics.inc("llm_hedged_requests_total", outcome="skipped", **self.labels)
+                    else:
+                        self._credit -= 1
+                        self.hedges += 1
+                        self.metrics.inc("llm_hedged_requests_total", outcome="sent", **self.labels)
+                        pending.add(asyncio.ensure_future(request))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    self.record(time.monotonic() - start)
+                    if task is not primary:
+                        self.hedge_wins += 1
+                        self.metrics.inc("llm_hedged_requests_total", outcome="won", **self.labels)
+                    return task.result()
+            raise error
+        finally:
+            # 取消较慢的请求
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "extra_ratio": self.hedges / self.requests if self.requests else 0.0,
+            "delay_seconds": self.delay()
+        }
@@ -0,0 +1,97 @@
+"""
+增量解析模型输出的 JSON 数组。
+
+模型按片段返回文本时，每当数组中的一个顶层对象闭合就立即解析并返回，
+不必等待完整响应：
+1. 数组被 max_tokens 截断时，已经闭合的对象仍然保留
+2. 某个对象格式错误时只丢弃该对象，不影响其他对象
+3. 忽略数组前后的说明文字和 Markdown 代码块标记
+"""
+
+import json
+from typing import Dict, Any, List, Tuple
+from . import fastjson
+
+
+class JSONArrayStreamParser:
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.errors = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """输入一段文本，返回其中新闭合的顶层对象"""
+        items = []
+        for char in chunk:
+            if self._depth == 0:
+                # 只收集 '{' 开始的顶层对象，跳过数组括号、逗号和其他文字
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._parse(''.join(self._buffer))
+                    self._buffer = []
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    def _parse(self, text: str):
+        try:
+            item = fastjson.loads(text)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return None
+        if not isinstance(item, dict):
+            self.errors += 1
+            return None
+        return item
+
+    @property
+    def truncated(self) -> bool:
+        """是否有未闭合的对象（输出被截断）"""
+        return self._depth > 0
+
+
+def parse_json_items(content: str) -> List[Dict[str, Any]]:
+    """从完整文本中尽可能多地解析出 JSON 对象"""
+    return JSONArrayStreamParser().feed(content)
+
+
+def parse_json_response(content: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """解析模型返回的完整文本
+    Returns:
+        Tuple: (数据列表, 是否只解析出了部分数据)
+    """
+    try:
+        data = fastjson.loads(content)
+    except json.JSONDecodeError:
+        # 输出被截断或个别元素格式错误时，保留能解析出的对象
+        data = parse_json_items(content)
+        if not data:
+            raise ValueError("返回的不是有效的JSON格式")
+        return data, True
+    if isinstance(data, dict):
+        return [data], False
+    if not isinstance(data, list):
+        raise ValueError("返回的数据格式不正确")
+    return data, False
@@ -0,0 +1,157 @@
+"""
+长时间预测任务的进度记录。
+
+每个任务用 job_id 标识，已完成行的行号和输出保存在本地 SQLite 文件中：
+1. 每处理完一块就提交一次，进程崩溃或重启后最多丢失正在处理的块
+2. 以相同 job_id 重新运行时跳过已完成的行，只处理剩余部分
+3. 记录任务的技能指纹，提示词变化后不会误用旧结果
+
+行号和输出都以 JSON 文本保存，行号按 JSON 编码后比较。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class JobLedger:
+    def __init__(self, path: str = '.cache/jobs.sqlite'):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " total_rows INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_rows ("
+            " job_id TEXT NOT NULL,"
+            " row_id TEXT NOT NULL,"
+            " output TEXT NOT NULL,"
+            " completed_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, row_id))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def row_key(row_id: Any) -> str:
+        """行号的规范化文本"""
+        if hasattr(row_id, 'item'):
+            # numpy 标量
+            row_id = row_id.item()
+        return json.dumps(row_id, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        """生成任务配置的指纹"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def start(self, job_id: str, fingerprint: str, total_rows: int) -> None:
+        """登记任务，已存在时检查指纹是否一致"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is not None and row[0] != fingerprint:
+                raise ValueError(f"任务 {job_id} 的技能配置已变化，请使用新的 job_id 或先删除旧任务")
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, fingerprint, status, total_rows, created_at, updated_at)"
+                " VALUES (?, ?, 'running', ?, ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET"
+                " status = 'running', total_rows = excluded.total_rows, updated_at = excluded.updated_at",
+                (job_id, fingerprint, total_rows, now, now)
+            )
+            self._conn.commit()
+
+    def completed_keys(self, job_id: str) -> Set[str]:
+        """已完成行的行号文本"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_id FROM job_rows WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {row_id for (row_id,) in rows}
+
+    def record(self, job_id: str, outputs: Iterable[Tuple[Any, Dict[str, Any]]]) -> int:
+        """记录一批已完成的行并提交
+        Args:
+            job_id: 任务标识
+            outputs: (行号, 输出列字典) 序列
+        Returns:
+            int: 记录的行数
+        """
+        now = time.time()
+        values = [
+            (job_id, self.row_key(row_id), json.dumps(output, ensure_ascii=False, default=str), now)
+            for row_id, output in outputs
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_rows (job_id, row_id, output, completed_at)"
+                " VALUES (?, ?, ?, ?)",
+                values
+            )
+            self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id)
+            )
+            self._conn.commit()
+        return len(values)
+
+    def outputs(self, job_id: str, keys: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """读取已完成行的输出：行号文本 -> 输出列字典"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_id, output FROM job_rows WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        wanted = set(keys) if keys is not None else None
+        return {
+            row_id: json.loads(output)
+            for row_id, output in rows
+            if wanted is None or row_id in wanted
+        }
+
+    def finish(self, job_id: str) -> None:
+        """标记任务完成"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def delete(self, job_id: str) -> None:
+        """删除任务及其所有记录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def get_stats(self, job_id: str) -> Dict[str, Any]:
+        """获取任务进度"""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT status, total_rows FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            completed = self._conn.execute(
+                "SELECT COUNT(*) FROM job_rows WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+        status, total_rows = job if job is not None else (None, 0)
+        return {"status": status, "total_rows": total_rows, "completed_rows": completed}
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -1,6 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Sequence, Iterator
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
+import json
 import logging
+import time
 from pydantic import BaseModel
 
 
@@ -20,6 +24,79 @@ class MetricsData(BaseModel):
     end_time: Optional[datetime] = None
 
 
+# 请求延迟的默认分桶上界（秒），与 Prometheus 客户端的默认分桶接近
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """固定分桶直方图，记录一次观测只需一次二分查找和几次加法"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(bounds))
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """按桶内线性插值估计分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                if i == len(self.bounds):
+                    # 落在 +Inf 桶中时只能返回最大的有限上界
+                    return lower
+                upper = self.bounds[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.bounds[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(list(self.bounds) + ['+Inf'], self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": buckets,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+def _make_labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化为 Prometheus 标签，如 {model="gpt-4",le="0.5"}"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + '}'
+
+
 class MetricsCollector:
     def __init__(self):
         self.metrics = {
@@ -29,6 +106,16 @@ class MetricsCollector:
             "skills": {}  # 用于存储不同技能的指标
         }
         self.start_time = datetime.now()
+        # 计数器、仪表和直方图按 (指标名, 标签) 存放在普通字典中，记录一次只是
+        # 一次字典查找和加法；同一个事件循环内调用不需要加锁
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        # 调用方传入的 (指标名, 标签) -> 规范化后的序列键，避免每次排序标签
+        self._keys: Dict[Tuple[str, Tuple], Tuple[str, Labels]] = {}
+        self.started = time.monotonic()
+        # 上次快照的时间和计数器值，用于计算最近的速率
+        self._last_snapshot = (self.started, {})
     
     def start_tracking(self, category: str, skill_name: Optional[str] = None):
         """开始追踪某个类别的指标"""
@@ -69,3 +156,141 @@ class MetricsCollector:
                 for k, v in self.metrics.items()
             }
         }
+
+    def _key(self, name: str, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+        raw = (name, tuple(labels.items()))
+        key = self._keys.get(raw)
+        if key is None:
+            key = self._keys[raw] = (name, _make_labels(labels))
+        return key
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器加 value"""
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self.gauges[self._key(name, labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        key = self._key(name, labels)
+        self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+        **labels
+    ) -> None:
+        """记录一次观测值到直方图"""
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def track_inflight(self, name: str, **labels) -> Iterator[None]:
+        """在代码块执行期间把仪表加 1"""
+        key = self._key(name, labels)
+        self.gauges[key] = self.gauges.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            self.gauges[key] -= 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """记录代码块的执行时间（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_usage(self, usage: Any, **labels) -> None:
+        """记录 response.usage 中的 token 数"""
+        if usage is None:
+            return
+        self.inc("llm_prompt_tokens_total", getattr(usage, 'prompt_tokens', 0) or 0, **labels)
+        self.inc("llm_completion_tokens_total", getattr(usage, 'completion_tokens', 0) or 0, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前所有指标，计数器附带平均速率和距上次快照的速率"""
+        now = time.monotonic()
+        uptime = max(now - self.started, 1e-9)
+        last_time, last_counters = self._last_snapshot
+        interval = max(now - last_time, 1e-9)
+        counters = dict(self.counters)
+        self._last_snapshot = (now, counters)
+        return {
+            "uptime_seconds": uptime,
+            "counters": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "value": value,
+                    "rate_per_second": value / uptime,
+                    "recent_rate_per_second": (value - last_counters.get((name, labels), 0)) / interval
+                }
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.gauges.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+            ]
+        }
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines: List[str] = []
+        declared = set()
+
+        def declare(name: str, metric_type: str) -> None:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in sorted(self.gauges.items()):
+            declare(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.bounds) + ['+Inf'], histogram.counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str) -> None:
+        """把当前快照保存到磁盘，.json 后缀保存为 JSON，其他保存为 Prometheus 文本格式"""
+        if path.endswith('.json'):
+            content = json.dumps(
+                {**self.snapshot(), "summary": self.get_summary()},
+                ensure_ascii=False, indent=2, default=str
+            )
+        else:
+            content = self.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+_collector: Optional[MetricsCollector] = None
+
+
+def get_metrics_collector() -> MetricsCollector:
+    """获取进程内共享的指标收集器"""
+    global _collector
+    if _collector is None:
+        _collector = MetricsCollector()
+    return _collector
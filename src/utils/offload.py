@@ -0,0 +1,76 @@
+"""
+把 CPU 密集的后处理（JSON 解析、数据校验）移出事件循环。
+
+三种模式：
+1. inline：在事件循环线程中直接执行（默认，没有额外开销）
+2. thread：在线程池中执行，事件循环在 GIL 切换间隙仍能处理网络 I/O
+3. process：在进程池中执行，真正并行，但参数和结果需要序列化，
+   函数必须是模块级函数
+
+调用方应以批为单位提交（例如一次响应的全部数据），避免逐条提交的调度和序列化开销。
+同一配置的调用方共享同一个执行器。
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+OFFLOAD_MODES = ('inline', 'thread', 'process')
+
+
+class CPUOffloader:
+    def __init__(self, mode: str = 'inline', max_workers: Optional[int] = None):
+        """
+        Args:
+            mode: inline、thread 或 process
+            max_workers: 线程或进程数，默认由 concurrent.futures 决定
+        """
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"不支持的后处理模式: {mode}，可选值: {', '.join(OFFLOAD_MODES)}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        """获取执行器（在首次使用时创建）"""
+        if self._executor is None:
+            if self.mode == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='databuilder-cpu'
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """执行 func(*args)，按模式在当前线程、线程池或进程池中运行"""
+        if self.mode == 'inline':
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args))
+
+    def shutdown(self) -> None:
+        """关闭执行器，下次使用时重新创建"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_offloaders: Dict[Tuple[str, Optional[int]], CPUOffloader] = {}
+
+
+def get_offloader(mode: str = 'inline', max_workers: Optional[int] = None) -> CPUOffloader:
+    """获取指定配置的共享执行器"""
+    key = (mode, max_workers)
+    offloader = _offloaders.get(key)
+    if offloader is None:
+        offloader = CPUOffloader(mode, max_workers)
+        _offloaders[key] = offloader
+    return offloader
+
+
+def shutdown_offloaders() -> None:
+    """关闭所有共享执行器"""
+    for offloader in _offloaders.values():
+        offloader.shutdown()
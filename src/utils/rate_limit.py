@@ -0,0 +1,152 @@
+"""
+进程内共享的令牌桶限流器。
+
+同一端点（base_url + 模型名）的所有 OpenAIModel / OpenAIRuntime 实例共享一个
+RateLimiter，同时限制每分钟请求数（RPM）和每分钟 token 数（TPM）：
+1. 请求前按估算的 token 数从两个令牌桶中取令牌，不足时等待补充
+2. 响应返回后可以用实际用量修正估算误差
+3. 收到 429 时可以按 Retry-After 暂停该端点的所有请求
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self._updated_at) * self.refill_per_second
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """返回取出 amount 个令牌还需等待的秒数"""
+        self._refill()
+        # 单次请求超过桶容量时，只要求桶是满的，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        """取出令牌（允许透支为负数）"""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """归还令牌"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None
+    ):
+        self.request_bucket: Optional[TokenBucket] = None
+        self.token_bucket: Optional[TokenBucket] = None
+        self.configure(requests_per_minute, tokens_per_minute)
+        self._blocked_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configure(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None
+    ) -> None:
+        """设置限流额度，None 表示保持原设置"""
+        if requests_per_minute and (
+            self.request_bucket is None or self.request_bucket.capacity != requests_per_minute
+        ):
+            self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        if tokens_per_minute and (
+            self.token_bucket is None or self.token_bucket.capacity != tokens_per_minute
+        ):
+            self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    def _get_lock(self) -> asyncio.Lock:
+        """获取当前事件循环上的锁，asyncio.Lock 不能跨事件循环使用"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """等待直到可以发送一个占用 tokens 个 token 的请求"""
+        # 持锁等待，保证先到的请求先获得额度
+        async with self._get_lock():
+            while True:
+                wait = self._blocked_until - time.monotonic()
+                if self.request_bucket:
+                    wait = max(wait, self.request_bucket.wait_time(1))
+                if self.token_bucket and tokens:
+                    wait = max(wait, self.token_bucket.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.request_bucket:
+                self.request_bucket.consume(1)
+            if self.token_bucket and tokens:
+                self.token_bucket.consume(tokens)
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """不等待地获取额度：没有排队的请求且额度充足时扣除额度并返回 True"""
+        if self._lock is not None and self._lock.locked():
+            return False
+        if self._blocked_until > time.monotonic():
+            return False
+        if self.request_bucket and self.request_bucket.wait_time(1) > 0:
+            return False
+        if self.token_bucket and tokens and self.token_bucket.wait_time(tokens) > 0:
+            return False
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket and tokens:
+            self.token_bucket.consume(tokens)
+        return True
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """用实际 token 用量修正请求前的估算"""
+        if not self.token_bucket:
+            return
+        diff = estimated_tokens - actual_tokens
+        if diff > 0:
+            self.token_bucket.refund(diff)
+        elif diff < 0:
+            self.token_bucket.consume(-diff)
+
+    def pause(self, seconds: float) -> None:
+        """暂停该端点的所有请求（用于响应 Retry-After）"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(
+    key: str,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None
+) -> RateLimiter:
+    """获取进程内共享的限流器，同一个 key 返回同一个实例"""
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        _limiters[key] = limiter
+    else:
+        limiter.configure(requests_per_minute, tokens_per_minute)
+    return limiter
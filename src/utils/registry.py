@@ -0,0 +1,66 @@
+"""
+按名称延迟加载实现类的注册表。
+
+注册时只记录 "模块路径:类名"，第一次使用时才导入对应模块，
+避免导入包时就加载 openai、pandas 等较重的依赖。
+第三方包可以通过 entry points 注册自己的实现，例如在 pyproject.toml 中：
+
+    [project.entry-points."databuilder.models"]
+    my_model = "my_package.models:MyModel"
+"""
+
+import importlib
+from typing import Any, Dict, List, Optional, Union
+
+
+class LazyRegistry:
+    def __init__(self, kind: str, entry_point_group: Optional[str] = None):
+        """
+        Args:
+            kind: 注册的类型名称，用于错误信息
+            entry_point_group: 查找第三方实现的 entry points 分组
+        """
+        self.kind = kind
+        self.entry_point_group = entry_point_group
+        # 名称 -> "模块路径:类名" 或已加载的类
+        self._targets: Dict[str, Union[str, Any]] = {}
+        self._entry_points_loaded = False
+
+    def register(self, name: str, target: Union[str, Any]) -> None:
+        """注册实现，target 可以是 "模块路径:类名" 或类本身"""
+        self._targets[name.lower()] = target
+
+    def get(self, name: str) -> Any:
+        """获取实现类，首次使用时导入所在模块"""
+        key = name.lower()
+        if key not in self._targets:
+            self._load_entry_points()
+        target = self._targets.get(key)
+        if target is None:
+            raise ValueError(f"不支持的{self.kind}类型: {name}")
+        if isinstance(target, str):
+            module_name, _, attr = target.partition(':')
+            target = getattr(importlib.import_module(module_name), attr)
+            self._targets[key] = target
+        return target
+
+    def names(self) -> List[str]:
+        self._load_entry_points()
+        return sorted(self._targets)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.names()
+
+    def _load_entry_points(self) -> None:
+        """加载第三方包通过 entry points 注册的实现（只在查找失败时加载一次）"""
+        if self._entry_points_loaded or not self.entry_point_group:
+            return
+        self._entry_points_loaded = True
+        from importlib.metadata import entry_points
+        try:
+            found = entry_points(group=self.entry_point_group)
+        except TypeError:
+            # Python 3.9 及更早版本
+            found = entry_points().get(self.entry_point_group, [])
+        for entry_point in found:
+            self._targets.setdefault(entry_point.name.lower(), entry_point.value)
@@ -1,41 +1,99 @@
 """
-在 OpenAI 模型中使用重试装饰器了。
+在 OpenAI 模型和运行时中使用重试装饰器。
 
 这个重试机制具有以下特点：
 1. 指数退避：每次重试的等待时间会指数增加
-2. 随机抖动：避免多个请求同时重试
+2. 随机抖动：在退避时间内随机取值，避免多个请求同时重试
 3. 最大重试次数限制
 4. 最大延迟时间限制
+5. 错误分类：只重试限流、超时、连接错误和服务端错误，参数或校验错误直接抛出
+6. 遵守 Retry-After：服务端给出等待时间时按该时间等待
 """
 
 import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+
+
+# 可以重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# 可以重试的异常类型名（openai SDK 中的网络类异常，按名称判断以免引入依赖）
+RETRYABLE_ERROR_NAMES = {'APITimeoutError', 'APIConnectionError'}
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """判断异常是否值得重试"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return False
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """从异常携带的响应头中读取 Retry-After 秒数"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        # HTTP 日期格式
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
 
 
 def retry_with_exponential_backoff(
     max_retries: int = 3,
     initial_delay: float = 1,
     max_delay: float = 10,
-    exponential_base: float = 2
+    exponential_base: float = 2,
+    jitter: bool = True,
+    retry_on: Callable[[BaseException], bool] = is_retryable_error
 ):
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         async def wrapper(*args, **kwargs) -> Any:
             delay = initial_delay
             last_exception = None
-            
+
             for attempt in range(max_retries):
                 try:
                     return await func(*args, **kwargs)
                 except Exception as e:
                     last_exception = e
-                    if attempt == max_retries - 1:
+                    if attempt == max_retries - 1 or not retry_on(e):
                         raise last_exception
-                    
-                    await asyncio.sleep(delay)
+
+                    wait = random.uniform(0, delay) if jitter else delay
+                    retry_after = get_retry_after(e)
+                    if retry_after is not None:
+                        wait = max(wait, retry_after)
+                    await asyncio.sleep(wait)
                     delay = min(delay * exponential_base, max_delay)
-            
+
             raise last_exception
         return wrapper
     return decorator
@@ -0,0 +1,115 @@
+"""
+可断点续写的 JSONL 数据写入器。
+
+每写入一批数据就追加到 JSONL 文件并刷新到磁盘，同时更新旁边的
+manifest 文件（<output_path>.manifest.json），记录已提交的条数和字节偏移。
+进程崩溃后以 resume=True 重新打开时，会截掉最后一次提交之后写了一半的内容，
+从已提交的位置继续写入。
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional
+from .tracing import trace_span
+from . import fastjson
+
+
+class JSONLDatasetWriter:
+    def __init__(self, output_path: str, resume: bool = False, fsync: bool = False):
+        self.path = Path(output_path)
+        self.manifest_path = Path(f"{output_path}.manifest.json")
+        self.fsync = fsync
+        self.count = 0
+        self.offset = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if resume and self.path.exists():
+            self._recover()
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(self.offset)
+            self._file.seek(self.offset)
+        else:
+            self._file = open(self.path, 'wb')
+            self._write_manifest()
+
+    def _recover(self) -> None:
+        """根据 manifest 恢复已提交的位置，没有 manifest 时扫描文件"""
+        manifest = self.load_manifest(str(self.path))
+        if manifest and manifest.get('offset', 0) <= self.path.stat().st_size:
+            self.count = manifest['count']
+            self.offset = manifest['offset']
+            return
+
+        # 没有可用的 manifest：保留所有完整且可解析的行
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                self.count += 1
+                self.offset += len(line)
+
+    @staticmethod
+    def load_manifest(output_path: str) -> Optional[Dict[str, Any]]:
+        """读取 manifest，不存在或损坏时返回 None"""
+        try:
+            with open(f"{output_path}.manifest.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, **extra: Any) -> None:
+        manifest = {
+            "path": str(self.path),
+            "count": self.count,
+            "offset": self.offset,
+            "updated_at": time.time(),
+            **extra
+        }
+        # 先写临时文件再替换，保证 manifest 本身不会写坏
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_batch(self, items: List[Dict[str, Any]]) -> None:
+        """追加一批数据并提交"""
+        if not items:
+            return
+        with trace_span("io.write_batch", items=len(items)):
+            data = b''.join(fastjson.dumps_bytes(item) + b'\n' for item in items)
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.count += len(items)
+            self.offset += len(data)
+            self._write_manifest()
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        """逐条读取已提交的数据"""
+        with open(self.path, 'rb') as f:
+            read = 0
+            for line in f:
+                read += len(line)
+                if read > self.offset:
+                    break
+                yield fastjson.loads(line)
+
+    def close(self, complete: bool = False) -> None:
+        """关闭文件，complete=True 时在 manifest 中标记数据集已完成"""
+        if self._file.closed:
+            return
+        self._file.close()
+        self._write_manifest(complete=complete)
+
+    def __enter__(self) -> 'JSONLDatasetWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
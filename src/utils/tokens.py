@@ -0,0 +1,67 @@
+"""
+token 数量估算。
+
+不依赖具体分词器的粗略估算：中日韩字符按每字 1 个 token 计算，
+其余字符按每 4 个字符 1 个 token 计算，每条消息额外计 4 个 token 的格式开销。
+限流使用这种估算；需要准确计数时使用 count_tokens，安装了 tiktoken 时按模型的
+分词器计数，否则退回到估算。
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+
+_CJK_PATTERN = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_message_tokens(
+    messages: List[Dict[str, Any]],
+    max_tokens: Optional[int] = None
+) -> int:
+    """估算一次对话请求占用的 token 数（提示词 + 预留的补全长度）"""
+    total = 0
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(str(message.get('content') or ''))
+    return total + (max_tokens or 0)
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]):
+    """获取模型对应的 tiktoken 编码，未安装 tiktoken 或无法加载时返回 None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        print(f"加载分词器出错，使用估算值: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """计算文本的 token 数，安装了 tiktoken 时使用模型的分词器"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_text_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,223 @@
+"""
+基于 span 的轻量级链路追踪。
+
+用 with trace_span("名称", 属性=值): 包住需要计时的代码，span 之间的父子关系通过
+contextvars 传递，asyncio.gather 创建的子任务会自动继承当前 span。
+结束的 span 交给导出器处理，ChromeTraceExporter 输出 Chrome trace_event 格式的
+JSON，可以在 chrome://tracing 或 https://ui.perfetto.dev 中查看。
+
+未启用追踪时 trace_span 直接返回一个共享的空上下文管理器，开销只有一次函数调用。
+
+用法：
+    exporter = ChromeTraceExporter("trace.json")
+    enable_tracing(exporter)
+    ...
+    disable_tracing()  # 写出文件
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes',
+                 'thread_id', 'task_id', '_token', '_tracer')
+
+    def __init__(self, tracer: 'Tracer', name: str, attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = 0
+        self.parent_id: Optional[int] = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.thread_id = 0
+        self.task_id: Optional[int] = None
+        self._token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> 'Span':
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = next(self._tracer._ids)
+        self.thread_id = threading.get_ident()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        self.task_id = id(task) if task is not None else None
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self._tracer._finish(self)
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar('databuilder_current_span', default=None)
+
+
+class SpanExporter:
+    """span 导出器基类"""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        """停止追踪时调用，用于写出缓冲的数据"""
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """把结束的 span 保存在内存中"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class ChromeTraceExporter(SpanExporter):
+    """输出 Chrome trace_event 格式的 JSON
+
+    每个 asyncio 任务显示为单独的一行（tid），同一任务内的 span 按调用关系嵌套。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.events: List[Dict[str, Any]] = []
+        self._pid = os.getpid()
+        self._epoch_ns = time.perf_counter_ns()
+        # 任务或线程 -> 从 1 开始的行号
+        self._lanes: Dict[Any, int] = {}
+
+    def _lane(self, span: Span) -> int:
+        key = ('task', span.task_id) if span.task_id is not None else ('thread', span.thread_id)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = len(self._lanes) + 1
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": self._pid, "tid": lane,
+                "args": {"name": f"{key[0]}-{lane}"}
+            })
+        return lane
+
+    def export(self, span: Span) -> None:
+        self.events.append({
+            "name": span.name,
+            "cat": span.name.split('.')[0],
+            "ph": "X",
+            "ts": (span.start_ns - self._epoch_ns) / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": self._pid,
+            "tid": self._lane(span),
+            "args": {
+                **{key: _jsonable(value) for key, value in span.attributes.items()},
+                "span_id": span.span_id,
+                "parent_id": span.parent_id
+            }
+        })
+
+    def shutdown(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.exporters: List[SpanExporter] = []
+        self._ids = itertools.count(1)
+
+    def span(self, name: str, **attributes) -> Any:
+        """创建 span，未启用时返回空的上下文管理器"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def _finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"导出 span 出错: {str(e)}")
+
+    def enable(self, *exporters: SpanExporter) -> None:
+        self.exporters.extend(exporters)
+        self.enabled = True
+
+    def disable(self) -> None:
+        """停止追踪并关闭所有导出器"""
+        self.enabled = False
+        exporters, self.exporters = self.exporters, []
+        for exporter in exporters:
+            try:
+                exporter.shutdown()
+            except Exception as e:
+                print(f"关闭导出器出错: {str(e)}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """获取进程内共享的追踪器"""
+    return _tracer
+
+
+def trace_span(name: str, **attributes) -> Any:
+    """在共享追踪器上创建 span"""
+    if not _tracer.enabled:
+        return _NOOP_SPAN
+    return Span(_tracer, name, attributes)
+
+
+def enable_tracing(*exporters: SpanExporter) -> Tracer:
+    _tracer.enable(*exporters)
+    return _tracer
+
+
+def disable_tracing() -> None:
+    _tracer.disable()